@@ -1,13 +1,93 @@
 import os
-from flask import Flask, render_template_string, send_file, abort, jsonify
+import base64
+import bisect
+import contextvars
+import csv
+import fcntl
+import gzip
+import hashlib
+import io
+import json
+import math
+import mimetypes
+import queue
+import random
+import shutil
+import signal
+import sqlite3
+import http.client
+import urllib.parse
+from html import escape
+from flask import Flask, Response, abort, jsonify, request, stream_with_context
 import subprocess
 import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 
-app = Flask(__name__)
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip is always available
+    brotli = None
+
+try:
+    import boto3
+    from botocore.config import Config as BotoConfig
+except ImportError:  # boto3 is only needed for the AWS inventory
+    boto3 = None
+
+app = Flask(__name__, static_folder=None)  # assets are served from memory, see static_asset()
+
+def parse_env_list(value):
+    """Split a comma-separated environment value into a list of non-empty items"""
+    return [item.strip() for item in (value or '').split(',') if item.strip()]
 
 # Environment variables
 PORT = int(os.environ.get('PORT', 9001))
 CLOUD_PROVIDER = os.environ.get('CLOUD_PROVIDER')
+BASE_DIR = os.environ.get('BASE_DIR', os.path.dirname(os.path.abspath(__file__)))
+
+# Serving mode: 'development' runs the Werkzeug server, 'production' runs gunicorn
+# with pre-forked workers that share a single inventory snapshot
+SERVER_MODE = os.environ.get('SERVER_MODE', 'development')
+WEB_WORKERS = int(os.environ.get('WEB_WORKERS', 2))
+WEB_THREADS = int(os.environ.get('WEB_THREADS', 8))
+WEB_TIMEOUT = int(os.environ.get('WEB_TIMEOUT', 120))
+
+# File through which worker processes share the inventory snapshot; defaults to
+# shared memory in production mode and is disabled otherwise
+SHARED_SNAPSHOT_PATH = os.environ.get('SHARED_SNAPSHOT_PATH') or (
+    os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), f"zt-cloud-inventory-{PORT}.json")
+    if SERVER_MODE == 'production' else None)
+
+# Directory where the last good inventory snapshots are persisted across restarts
+# (disabled when unset), and the age in seconds beyond which a persisted one is discarded
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR') or None
+SNAPSHOT_MAX_AGE = int(os.environ.get('SNAPSHOT_MAX_AGE', 86400))
+
+# Inventory change history: SQLite database of per-refresh deltas (defaults to
+# SNAPSHOT_DIR/history.sqlite3, disabled when neither is set), versions between
+# full checkpoints, how long history is kept (seconds), and the most changes
+# one history query returns
+HISTORY_DB_PATH = os.environ.get('HISTORY_DB_PATH') or (
+    os.path.join(SNAPSHOT_DIR, 'history.sqlite3') if SNAPSHOT_DIR else None)
+HISTORY_CHECKPOINT_EVERY = max(1, int(os.environ.get('HISTORY_CHECKPOINT_EVERY', 50)))
+HISTORY_RETENTION = int(os.environ.get('HISTORY_RETENTION', 7 * 86400))
+HISTORY_MAX_CHANGES = int(os.environ.get('HISTORY_MAX_CHANGES', 10000))
+
+# Seconds clients are asked to wait before retrying while the background login runs
+STARTUP_RETRY_AFTER = int(os.environ.get('STARTUP_RETRY_AFTER', 2))
+
+# Static assets: files loaded into memory at startup, and the size up to which
+# they are inlined into the main page as data URIs when INLINE_ASSETS is enabled
+STATIC_ASSETS = ['aws-logo.svg', 'azure-logo.svg']
+INLINE_ASSETS = os.environ.get('INLINE_ASSETS', 'false').lower() in ('1', 'true', 'yes')
+INLINE_ASSET_MAX_BYTES = int(os.environ.get('INLINE_ASSET_MAX_BYTES', 4096))
 
 # AWS Environment variables
 AWS_ACCESS_KEY_ID = os.environ.get('AWS_ACCESS_KEY_ID', 'Not set')
@@ -19,6 +99,18 @@ AWS_SANDBOX_ACCOUNT_ID = os.environ.get('AWS_SANDBOX_ACCOUNT_ID', 'Not set')
 AWS_ROUTE53_DOMAIN = os.environ.get('AWS_ROUTE53_DOMAIN', 'Not set')
 AWS_DEFAULT_REGION = os.environ.get('AWS_DEFAULT_REGION', 'Not set')
 
+# AWS inventory: regions scanned in parallel ('all' for every enabled region),
+# an endpoint override for pointing boto3 at a local AWS API stand-in, and the
+# connection pool size of each regional client
+AWS_REGIONS = parse_env_list(os.environ.get('AWS_REGIONS')) or [
+    AWS_DEFAULT_REGION if AWS_DEFAULT_REGION != 'Not set' else 'us-east-1']
+AWS_ENDPOINT_URL = os.environ.get('AWS_ENDPOINT_URL') or None
+AWS_FANOUT_WORKERS = int(os.environ.get('AWS_FANOUT_WORKERS', 8))
+AWS_POOL_SIZE = int(os.environ.get('AWS_POOL_SIZE', 10))
+AWS_API_TIMEOUT = int(os.environ.get('AWS_API_TIMEOUT', 30))
+AWS_CACHE_TTL = int(os.environ.get('AWS_CACHE_TTL', 300))
+AWS_CACHE_MAX_STALE = int(os.environ.get('AWS_CACHE_MAX_STALE', 3600))
+
 # Azure Environment variables
 AZURE_TENANT_ID = os.environ.get('AZURE_TENANT', 'Not set')
 AZURE_CLIENT_ID = os.environ.get('AZURE_CLIENT_ID', 'Not set')
@@ -26,13 +118,1726 @@ AZURE_PASSWORD = os.environ.get('AZURE_PASSWORD', 'Not set')
 AZURE_SUBSCRIPTION = os.environ.get('AZURE_SUBSCRIPTION', 'Not set')
 AZURE_RESOURCEGROUP = os.environ.get('AZURE_RESOURCEGROUP', 'Not set')
 
+# Inventory scope: subscriptions and resource groups to list, queried concurrently.
+# They default to AZURE_SUBSCRIPTION and AZURE_RESOURCEGROUP. A resource group
+# may be given as 'subscription/group' to pin it to one subscription, and '*'
+# lists whole subscriptions.
+AZURE_SUBSCRIPTIONS = parse_env_list(os.environ.get('AZURE_SUBSCRIPTIONS')) or (
+    [AZURE_SUBSCRIPTION] if AZURE_SUBSCRIPTION != 'Not set' else [])
+AZURE_RESOURCEGROUPS = parse_env_list(os.environ.get('AZURE_RESOURCEGROUPS')) or (
+    [AZURE_RESOURCEGROUP] if AZURE_RESOURCEGROUP != 'Not set' else [])
+AZURE_FANOUT_WORKERS = int(os.environ.get('AZURE_FANOUT_WORKERS', 4))
+
+# Native ARM client settings; AZURE_CLIENT_MODE is 'auto' (native with CLI fallback), 'native' or 'cli'
+AZURE_CLIENT_MODE = os.environ.get('AZURE_CLIENT_MODE', 'auto')
+AZURE_AUTHORITY_HOST = os.environ.get('AZURE_AUTHORITY_HOST', 'https://login.microsoftonline.com').rstrip('/')
+AZURE_RESOURCE_MANAGER = os.environ.get('AZURE_RESOURCE_MANAGER', 'https://management.azure.com').rstrip('/')
+AZURE_ARM_POOL_SIZE = int(os.environ.get('AZURE_ARM_POOL_SIZE', 4))
+AZURE_ARM_TIMEOUT = int(os.environ.get('AZURE_ARM_TIMEOUT', 30))
+
+# Resolve resource relationships (VM -> NIC -> VNet, disk -> VM, ...) with one
+# Resource Graph query per refresh, so the diagram can draw real dependencies
+AZURE_RELATIONSHIPS = os.environ.get('AZURE_RELATIONSHIPS', 'true').lower() in ('1', 'true', 'yes')
+
+# Diagram layout settings: canvas width, resources drawn per group before
+# collapsing the rest into "+N more", and group count above which only the
+# visible viewport is rendered
+AZURE_DIAGRAM_MAX_WIDTH = int(os.environ.get('AZURE_DIAGRAM_MAX_WIDTH', 1200))
+AZURE_DIAGRAM_GROUP_LIMIT = max(2, int(os.environ.get('AZURE_DIAGRAM_GROUP_LIMIT', 8)))
+AZURE_DIAGRAM_VIRTUALIZE_ABOVE = int(os.environ.get('AZURE_DIAGRAM_VIRTUALIZE_ABOVE', 150))
+
+# Azure CLI executor: concurrent az processes, callers allowed to wait for a
+# slot, how long they wait, and the per-command timeout (seconds)
+AZURE_CLI_MAX_CONCURRENCY = int(os.environ.get('AZURE_CLI_MAX_CONCURRENCY', 2))
+AZURE_CLI_MAX_QUEUE = int(os.environ.get('AZURE_CLI_MAX_QUEUE', 4))
+AZURE_CLI_QUEUE_TIMEOUT = float(os.environ.get('AZURE_CLI_QUEUE_TIMEOUT', 30))
+AZURE_CLI_TIMEOUT = int(os.environ.get('AZURE_CLI_TIMEOUT', 30))
+
+# Credential manager: renew the service principal's credentials this many
+# seconds before they expire, assume a CLI session lasts AZURE_CLI_SESSION_TTL
+# when az doesn't report the token expiry, and retry failed logins with jittered
+# exponential backoff between the two bounds (seconds)
+AZURE_CREDENTIAL_REFRESH_MARGIN = int(os.environ.get('AZURE_CREDENTIAL_REFRESH_MARGIN', 600))
+AZURE_CLI_SESSION_TTL = int(os.environ.get('AZURE_CLI_SESSION_TTL', 3600))
+AZURE_LOGIN_BACKOFF_MIN = float(os.environ.get('AZURE_LOGIN_BACKOFF_MIN', 5))
+AZURE_LOGIN_BACKOFF_MAX = float(os.environ.get('AZURE_LOGIN_BACKOFF_MAX', 300))
+
+# Inventory cache settings (seconds)
+AZURE_CACHE_TTL = int(os.environ.get('AZURE_CACHE_TTL', 60))
+AZURE_CACHE_MAX_STALE = int(os.environ.get('AZURE_CACHE_MAX_STALE', 3600))
+
+# ARM throttling: minimum seconds between two listings of one subscription,
+# whoever asks; the remaining-reads level below which background polling slows
+# down, and the longest interval it slows down to; the pause after a 429 that
+# carries no Retry-After (seconds)
+AZURE_REFRESH_MIN_INTERVAL = float(os.environ.get('AZURE_REFRESH_MIN_INTERVAL', 15))
+AZURE_QUOTA_LOW_WATER = int(os.environ.get('AZURE_QUOTA_LOW_WATER', 100))
+AZURE_MAX_POLL_INTERVAL = float(os.environ.get('AZURE_MAX_POLL_INTERVAL', 600))
+AZURE_THROTTLE_BACKOFF = float(os.environ.get('AZURE_THROTTLE_BACKOFF', 60))
+
+# 'server' renders the inventory HTML on the server; 'client' ships compact
+# columnar JSON and renders the table and diagram in the browser
+AZURE_RENDER_MODE = os.environ.get('AZURE_RENDER_MODE', 'server')
+
+# Compact inventory markup: shared CSS classes instead of inline styles, SVG
+# icon symbols and no template whitespace. Disable to get the legacy markup.
+AZURE_COMPACT_OUTPUT = os.environ.get('AZURE_COMPACT_OUTPUT', 'true').lower() in ('1', 'true', 'yes')
+if AZURE_COMPACT_OUTPUT:
+    # Icons and non-ASCII names go out as UTF-8 instead of six-byte \u escapes
+    app.json.ensure_ascii = False
+
+# API responses at least this large are compressed when the client accepts it
+API_COMPRESS_MIN_BYTES = int(os.environ.get('API_COMPRESS_MIN_BYTES', 1024))
+
+# Default and maximum page size for filtered inventory queries
+AZURE_PAGE_SIZE = int(os.environ.get('AZURE_PAGE_SIZE', 100))
+AZURE_MAX_PAGE_SIZE = int(os.environ.get('AZURE_MAX_PAGE_SIZE', 1000))
+
+# Number of rows serialized per chunk of a streamed inventory export
+EXPORT_CHUNK_ROWS = int(os.environ.get('EXPORT_CHUNK_ROWS', 500))
+
+# Number of past inventory versions clients can request deltas against
+AZURE_VERSION_HISTORY = int(os.environ.get('AZURE_VERSION_HISTORY', 16))
+
+# Server-Sent Events: how often the shared poller checks the cache for a new
+# version, and how often idle streams get a keep-alive comment (seconds). Each
+# open stream occupies a worker thread, so a process serves at most
+# AZURE_STREAM_MAX_PER_WORKER of them (half its threads by default); pages
+# turned away poll every AZURE_STREAM_FALLBACK_POLL seconds instead
+AZURE_STREAM_CHECK_INTERVAL = float(os.environ.get('AZURE_STREAM_CHECK_INTERVAL', 2))
+AZURE_STREAM_HEARTBEAT = float(os.environ.get('AZURE_STREAM_HEARTBEAT', 15))
+AZURE_STREAM_MAX_PER_WORKER = int(os.environ.get('AZURE_STREAM_MAX_PER_WORKER', max(1, WEB_THREADS // 2)))
+AZURE_STREAM_FALLBACK_POLL = float(os.environ.get('AZURE_STREAM_FALLBACK_POLL', 30))
+
+# JMESPath query used for the Azure resource listing
+AZURE_RESOURCE_QUERY = '[].{id:id, name:name, type:type, resourceGroup:resourceGroup, location:location}'
+
+# Histogram bucket upper bounds for stage latencies (seconds) and payload sizes (bytes)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+class MetricsRegistry:
+    """Counters, gauges and histograms kept in memory and exported in the Prometheus text format
+
+    Values are per process; with several gunicorn workers a scrape reports the
+    worker that answered it. Collectors registered with ``add_collector`` run
+    before each export to refresh gauges read from other components.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta = {}
+        self._values = {}
+        self._collectors = []
+
+    def describe(self, name, kind, help_text, buckets=None):
+        """Declare a metric; ``kind`` is 'counter', 'gauge' or 'histogram'"""
+        self._meta[name] = (kind, help_text, buckets)
+        self._values[name] = {}
+
+    def add_collector(self, collector):
+        """Register a callable run before each export"""
+        self._collectors.append(collector)
+
+    def inc(self, name, amount=1, **labels):
+        """Add to a counter or gauge"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            values = self._values[name]
+            values[key] = values.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        """Set a gauge, or a counter mirrored from another component's totals"""
+        with self._lock:
+            self._values[name][tuple(sorted(labels.items()))] = value
+
+    def value(self, name, **labels):
+        """Return the current value of a counter or gauge"""
+        with self._lock:
+            return self._values[name].get(tuple(sorted(labels.items())), 0)
+
+    def observe(self, name, value, **labels):
+        """Record one observation in a histogram"""
+        buckets = self._meta[name][2]
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            state = self._values[name].get(key)
+            if state is None:
+                state = self._values[name][key] = [[0] * len(buckets), 0.0, 0]
+            index = bisect.bisect_left(buckets, value)
+            if index < len(buckets):
+                state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        """Export every metric in the Prometheus text exposition format"""
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                print(f"Metrics collector failed: {e}", file=sys.stderr)
+
+        lines = []
+        with self._lock:
+            for name, (kind, help_text, buckets) in self._meta.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for key, value in sorted(self._values[name].items()):
+                    if kind != 'histogram':
+                        lines.append(f"{name}{format_metric_labels(key)} {format_metric_value(value)}")
+                        continue
+                    counts, total, count = value
+                    cumulative = 0
+                    for bound, bucket_count in zip(buckets, counts):
+                        cumulative += bucket_count
+                        lines.append(f"{name}_bucket{format_metric_labels(key + (('le', format_metric_value(bound)),))} {cumulative}")
+                    lines.append(f"{name}_bucket{format_metric_labels(key + (('le', '+Inf'),))} {count}")
+                    lines.append(f"{name}_sum{format_metric_labels(key)} {format_metric_value(total)}")
+                    lines.append(f"{name}_count{format_metric_labels(key)} {count}")
+        return '\n'.join(lines) + '\n'
+
+def format_metric_labels(labels):
+    """Format ``(name, value)`` pairs as a Prometheus label set"""
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+def format_metric_value(value):
+    """Format a sample value, keeping integers free of a trailing '.0'"""
+    if isinstance(value, float) and not value.is_integer():
+        return repr(value)
+    return str(int(value))
+
+metrics = MetricsRegistry()
+metrics.describe('zt_stage_duration_seconds', 'histogram', 'Time spent in each inventory pipeline stage', LATENCY_BUCKETS)
+metrics.describe('zt_response_bytes', 'histogram', 'Size of API response bodies', SIZE_BUCKETS)
+metrics.describe('zt_payload_bytes_per_1k_resources', 'gauge', 'Size of the last full inventory response per 1000 resources')
+metrics.describe('zt_fetches_in_flight', 'gauge', 'Inventory fetches currently running')
+metrics.describe('zt_fallbacks_total', 'counter', 'Inventory fetches that failed and produced fallback content')
+metrics.describe('zt_timeouts_total', 'counter', 'CLI commands and HTTP requests that timed out')
+metrics.describe('zt_login_failures_total', 'counter', 'Failed Azure login attempts')
+metrics.describe('zt_credential_refreshes_total', 'counter', 'Background Azure credential renewals by result')
+metrics.describe('zt_credential_expiry_seconds', 'gauge', 'Seconds until the Azure credentials expire')
+metrics.describe('zt_cache_requests_total', 'counter', 'Inventory cache lookups by outcome (hit, stale, throttled or miss)')
+metrics.describe('zt_cache_hit_ratio', 'gauge', 'Share of inventory cache lookups answered without a synchronous fetch')
+metrics.describe('zt_cache_age_seconds', 'gauge', 'Age of the cached inventory snapshot')
+metrics.describe('zt_inventory_resources', 'gauge', 'Resources in the cached inventory snapshot')
+metrics.describe('zt_arm_remaining_reads', 'gauge', 'Remaining ARM read quota last reported for each subscription')
+metrics.describe('zt_arm_throttled_total', 'counter', 'ARM requests and CLI commands rejected with 429 Too Many Requests')
+metrics.describe('zt_refreshes_deferred_total', 'counter', 'Subscription listings skipped by the refresh scheduler, by priority')
+metrics.describe('zt_cli_executor_commands', 'gauge', 'Azure CLI commands currently running or waiting for a slot')
+metrics.describe('zt_cli_executor_commands_total', 'counter', 'Azure CLI commands by outcome')
+
+@contextmanager
+def timed_stage(stage, timings=None):
+    """Time a block into the stage latency histogram, and into ``timings`` for Server-Timing
+
+    Also usable as a decorator for functions that are a stage on their own.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.observe('zt_stage_duration_seconds', elapsed, stage=stage)
+        if timings is not None:
+            timings.append((stage, elapsed))
+
+@contextmanager
+def tracked_fetch(provider):
+    """Count a running inventory fetch in the in-flight gauge and time it as a stage"""
+    metrics.inc('zt_fetches_in_flight', provider=provider)
+    try:
+        with timed_stage(f"{provider}_fetch"):
+            yield
+    finally:
+        metrics.inc('zt_fetches_in_flight', -1, provider=provider)
+
+def server_timing_header(timings):
+    """Format ``(stage, seconds)`` pairs as a Server-Timing header value"""
+    return ', '.join(f"{stage};dur={elapsed * 1000:.2f}" for stage, elapsed in timings)
+
+class Resource:
+    """Compact record for a single cloud resource"""
+
+    __slots__ = ('id', 'name', 'type', 'resource_group', 'location')
+
+    def __init__(self, id, name, type, resource_group, location):
+        self.id = id
+        self.name = name
+        self.type = type
+        self.resource_group = resource_group
+        self.location = location
+
+    def __repr__(self):
+        return f"Resource({self.id!r})"
+
+    def fingerprint(self):
+        """Return a hashable value that changes whenever a displayed field changes"""
+        return (self.name, self.type, self.resource_group, self.location)
+
+    def to_dict(self):
+        """Return the record as a JSON-serializable dict"""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'type': self.type,
+            'resourceGroup': self.resource_group,
+            'location': self.location,
+        }
+
+def inventory_version(resources, edges=()):
+    """Return a content version for a resource set and its relationships, independent of listing order"""
+    digest = hashlib.sha256()
+    for line in sorted('\t'.join((r.id,) + r.fingerprint()) for r in resources):
+        digest.update(line.encode('utf-8'))
+        digest.update(b'\n')
+    for line in sorted('\t'.join(('edge',) + edge) for edge in edges):
+        digest.update(line.encode('utf-8'))
+        digest.update(b'\n')
+    return digest.hexdigest()[:24]
+
+class InventorySnapshot:
+    """Resources parsed from one fetch, plus the views derived from them
+
+    The HTML and columnar encodings are built on first use and then reused.
+    ``render(snapshot)`` produces the provider's HTML unless ``html`` is given.
+    ``version`` is None for fallback snapshots built after a failed fetch.
+    ``edges`` are ``(source_id, target_id, label)`` relationships between resources.
+    """
+
+    __slots__ = ('resources', 'layout', 'version', 'sources', 'edges', '_render', '_html', '_columns', '_index')
+
+    def __init__(self, resources, layout=None, version=None, html=None, sources=None, edges=None, render=None):
+        self.resources = resources
+        self.layout = layout
+        self.version = version
+        self.sources = sources or []
+        self.edges = edges or []
+        self._render = render
+        self._html = html
+        self._columns = None
+        self._index = None
+
+    @property
+    def html(self):
+        """Server-rendered diagram and table"""
+        if self._html is None:
+            self._html = self._render(self)
+        return self._html
+
+    @property
+    def columns(self):
+        """Columnar encoding of the resources for client-side rendering"""
+        if self._columns is None:
+            self._columns = encode_inventory_columns(self.resources, self.edges)
+        return self._columns
+
+    @property
+    def index(self):
+        """Secondary indexes answering filtered, sorted and paged queries"""
+        if self._index is None:
+            self._index = InventoryIndex(self.resources)
+        return self._index
+
+# Query parameters usable as exact-match filters, and keys results can be sorted by
+INVENTORY_FILTERS = {'group': 'resource_group', 'type': 'type', 'location': 'location'}
+INVENTORY_SORT_KEYS = {'name': 'name', 'type': 'type', 'group': 'resource_group', 'location': 'location'}
+
+class InventoryIndex:
+    """Secondary indexes over one snapshot, built once and shared by every query
+
+    Filters map case-folded values to ascending position lists, names are kept
+    sorted for prefix lookups with bisect, and sort orders are computed once per
+    key on first use.
+    """
+
+    def __init__(self, resources):
+        self.resources = resources
+        self.postings = {}
+        self.facets = {}
+        for param, attr in INVENTORY_FILTERS.items():
+            postings = {}
+            values = {}
+            for position, resource in enumerate(resources):
+                value = getattr(resource, attr)
+                postings.setdefault(value.lower(), []).append(position)
+                values.setdefault(value.lower(), value)
+            self.postings[param] = postings
+            self.facets[param] = sorted(values.values(), key=str.lower)
+        self.names = sorted((resource.name.lower(), position) for position, resource in enumerate(resources))
+        self._orders = {}
+
+    def sort_order(self, key):
+        """Return ``(order, ranks)``: positions in sort order, and each position's rank"""
+        cached = self._orders.get(key)
+        if cached is None:
+            attr = INVENTORY_SORT_KEYS[key]
+            resources = self.resources
+            order = sorted(range(len(resources)),
+                           key=lambda i: (getattr(resources[i], attr).lower(), resources[i].name.lower()))
+            ranks = [0] * len(order)
+            for rank, position in enumerate(order):
+                ranks[position] = rank
+            cached = self._orders[key] = (order, ranks)
+        return cached
+
+    def query(self, filters=None, prefix='', sort='name', descending=False, offset=0, limit=AZURE_PAGE_SIZE):
+        """Return ``(total, resources)`` for one page of matching resources"""
+        candidates = [self.postings[param].get(value.lower(), []) for param, value in (filters or {}).items()]
+        if prefix:
+            prefix = prefix.lower()
+            lo = bisect.bisect_left(self.names, (prefix,))
+            hi = bisect.bisect_left(self.names, (prefix + '\uffff',))
+            candidates.append([position for _, position in self.names[lo:hi]])
+
+        order, ranks = self.sort_order(sort)
+        if not candidates:
+            total = len(order)
+            if descending:
+                end = max(0, total - offset)
+                page = order[max(0, end - limit):end][::-1]
+            else:
+                page = order[offset:offset + limit]
+        else:
+            # Intersect starting from the most selective filter
+            candidates.sort(key=len)
+            matches = set(candidates[0])
+            for other in candidates[1:]:
+                matches.intersection_update(other)
+            total = len(matches)
+            page = sorted(matches, key=ranks.__getitem__, reverse=descending)[offset:offset + limit]
+        return total, [self.resources[position] for position in page]
+
+def encode_inventory_columns(resources, edges=None):
+    """Encode resources column-wise, dictionary-encoding the low-cardinality columns
+
+    Each of ``type``, ``location`` and ``resourceGroup`` is a list of indexes
+    into the matching ``dictionaries`` list. ``icons`` parallels the type
+    dictionary. Resource IDs are left out to keep the payload small; ``edges``,
+    when given, are encoded as ``[source_index, target_index, label]``.
+    """
+    dictionaries = {'type': [], 'location': [], 'resourceGroup': []}
+    codes = {key: {} for key in dictionaries}
+    columns = {'name': [], 'type': [], 'location': [], 'resourceGroup': []}
+    for resource in resources:
+        columns['name'].append(resource.name)
+        for key, value in (('type', resource.type), ('location', resource.location),
+                           ('resourceGroup', resource.resource_group)):
+            code = codes[key].get(value)
+            if code is None:
+                code = codes[key][value] = len(dictionaries[key])
+                dictionaries[key].append(value)
+            columns[key].append(code)
+    encoded = {
+        'count': len(resources),
+        'columns': columns,
+        'dictionaries': dictionaries,
+        'icons': [get_resource_icon(t) for t in dictionaries['type']],
+    }
+    if edges is not None:
+        encoded['edges'] = encode_edges(resources, edges)
+    return encoded
+
+def encode_edges(resources, edges):
+    """Encode ``(source_id, target_id, label)`` edges as ``[source_index, target_index, label]``"""
+    positions = {resource.id: i for i, resource in enumerate(resources)}
+    return [[positions[source], positions[target], label] for source, target, label in edges]
+
+QUERY_PARAMS = ('group', 'type', 'location', 'prefix', 'sort', 'offset', 'limit', 'cursor', 'facets')
+
+def encode_query_cursor(version, offset):
+    """Return an opaque cursor for the next page of a query over one version"""
+    return base64.urlsafe_b64encode(f"{version}:{offset}".encode('ascii')).decode('ascii')
+
+def decode_query_cursor(cursor, version):
+    """Return the offset encoded in a cursor, or 0 when it belongs to another version"""
+    try:
+        cursor_version, offset = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('ascii').split(':')
+        offset = int(offset)
+    except ValueError:
+        raise ValueError('invalid cursor')
+    return offset if cursor_version == version and offset >= 0 else 0
+
+def parse_inventory_sort(args):
+    """Return ``(key, descending)`` for the ``sort`` parameter; raises ValueError"""
+    sort = args.get('sort', 'name')
+    descending = sort.startswith('-')
+    sort = sort.lstrip('-')
+    if sort not in INVENTORY_SORT_KEYS:
+        raise ValueError(f"sort must be one of {', '.join(INVENTORY_SORT_KEYS)}")
+    return sort, descending
+
+def query_inventory(snapshot, args):
+    """Answer a filtered, sorted and paged inventory query from the snapshot's indexes
+
+    Raises ValueError for malformed parameters.
+    """
+    sort, descending = parse_inventory_sort(args)
+    try:
+        limit = int(args.get('limit', AZURE_PAGE_SIZE))
+        offset = max(0, int(args.get('offset', 0)))
+    except ValueError:
+        raise ValueError('limit and offset must be integers')
+    if not 0 <= limit <= AZURE_MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 0 and {AZURE_MAX_PAGE_SIZE}")
+    if 'cursor' in args:
+        offset = decode_query_cursor(args['cursor'], snapshot.version)
+
+    filters = {param: args[param] for param in INVENTORY_FILTERS if args.get(param)}
+    index = snapshot.index
+    total, page = index.query(filters, args.get('prefix', ''), sort, descending, offset, limit)
+    result = {
+        'query': {
+            'total': total,
+            'offset': offset,
+            'limit': limit,
+            'sort': args.get('sort', 'name'),
+            'next_cursor': encode_query_cursor(snapshot.version, offset + limit) if limit and offset + limit < total else None,
+        },
+        'resources': page,
+    }
+    if args.get('facets'):
+        result['facets'] = index.facets
+    return result
+
+EXPORT_FIELDS = ('id', 'name', 'type', 'resourceGroup', 'location')
+
+def select_inventory_export(snapshot, args):
+    """Return every resource matching the query filters, in the requested order
+
+    Takes the same filter, prefix and sort parameters as query_inventory() but
+    no paging. Raises ValueError for malformed parameters.
+    """
+    sort, descending = parse_inventory_sort(args)
+    filters = {param: args[param] for param in INVENTORY_FILTERS if args.get(param)}
+    _, resources = snapshot.index.query(filters, args.get('prefix', ''), sort, descending, 0, len(snapshot.resources))
+    return resources
+
+def export_ndjson(resources, version):
+    """Yield resources as newline-delimited JSON, EXPORT_CHUNK_ROWS lines per chunk"""
+    for start in range(0, len(resources), EXPORT_CHUNK_ROWS):
+        yield ''.join(json.dumps(r.to_dict()) + '\n' for r in resources[start:start + EXPORT_CHUNK_ROWS])
+
+def export_csv(resources, version):
+    """Yield resources as CSV with a header row, EXPORT_CHUNK_ROWS rows per chunk"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for start in range(0, len(resources), EXPORT_CHUNK_ROWS):
+        writer.writerows((r.id, r.name, r.type, r.resource_group, r.location)
+                         for r in resources[start:start + EXPORT_CHUNK_ROWS])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def export_json(resources, version):
+    """Yield one JSON document ``{version, count, resources}``, built chunk by chunk"""
+    yield f'{{"version": {json.dumps(version)}, "count": {len(resources)}, "resources": ['
+    for start in range(0, len(resources), EXPORT_CHUNK_ROWS):
+        chunk = ', '.join(json.dumps(r.to_dict()) for r in resources[start:start + EXPORT_CHUNK_ROWS])
+        yield (', ' if start else '') + chunk
+    yield ']}\n'
+
+# Export format -> (serializer, mimetype, file extension)
+EXPORT_FORMATS = {
+    'ndjson': (export_ndjson, 'application/x-ndjson', 'ndjson'),
+    'csv': (export_csv, 'text/csv', 'csv'),
+    'json': (export_json, 'application/json', 'json'),
+}
+
+class VersionHistory:
+    """Per-resource fingerprints of recent inventory versions, used to compute deltas"""
+
+    def __init__(self, size):
+        self.size = size
+        self._lock = threading.Lock()
+        self._versions = OrderedDict()
+
+    def record(self, snapshot):
+        """Remember the fingerprints of a successfully fetched snapshot"""
+        fingerprints = {r.id: r.fingerprint() for r in snapshot.resources}
+        with self._lock:
+            self._versions[snapshot.version] = fingerprints
+            self._versions.move_to_end(snapshot.version)
+            while len(self._versions) > self.size:
+                self._versions.popitem(last=False)
+
+    def delta(self, since, snapshot):
+        """Return added, removed and changed resources since a known version, or None
+
+        None means the client needs the full inventory: the version is unknown or
+        one side is empty, in which case there is no table to patch.
+        """
+        with self._lock:
+            previous = self._versions.get(since)
+        if not previous or not snapshot.resources:
+            return None
+        current_ids = set()
+        added, changed = [], []
+        for resource in snapshot.resources:
+            current_ids.add(resource.id)
+            old = previous.get(resource.id)
+            if old is None:
+                added.append(resource)
+            elif old != resource.fingerprint():
+                changed.append(resource)
+        removed = [resource_id for resource_id in previous if resource_id not in current_ids]
+        return {'added': added, 'removed': removed, 'changed': changed}
+
+class SharedSnapshotStore:
+    """Inventory snapshot shared between worker processes through one file
+
+    Writes go to a temporary file that is renamed into place, so readers never
+    see a partial snapshot. ``load`` only reads when the file has changed.
+    ``dump``/``load_payload`` convert the payload to and from JSON-compatible data.
+    """
+
+    def __init__(self, path, dump, load_payload):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self.dump = dump
+        self.load_payload = load_payload
+        self._signature = None
+        self._signature_lock = threading.Lock()
+
+    def refresh_lock(self):
+        """Hold an exclusive lock, across threads and processes, while refreshing"""
+        return file_lock(self.lock_path)
+
+    def save(self, payload, fetched_at):
+        """Atomically replace the shared snapshot"""
+        data = json.dumps({'fetched_at': fetched_at, 'snapshot': self.dump(payload)}, separators=(',', ':'))
+        write_file_atomically(self.path, data.encode('utf-8'))
+        st = os.stat(self.path)
+        with self._signature_lock:
+            self._signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def load(self):
+        """Return ``(payload, fetched_at)`` if the file changed since the last call, else None"""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+        with self._signature_lock:
+            if signature == self._signature:
+                return None
+            self._signature = signature
+        with open(self.path, encoding='utf-8') as f:
+            data = json.load(f)
+        return self.load_payload(data['snapshot']), data['fetched_at']
+
+class PersistentSnapshotStore:
+    """Last good inventory snapshot kept on disk as gzip-compressed compact JSON
+
+    Saved after every successful refresh and read back once at startup, so a
+    restarted process can serve the previous inventory until its first fetch
+    completes. Snapshots older than ``max_age`` seconds are discarded.
+    """
+
+    FORMAT = 1
+
+    def __init__(self, path, dump, load_payload, max_age):
+        self.path = path
+        self.dump = dump
+        self.load_payload = load_payload
+        self.max_age = max_age
+
+    def save(self, payload, fetched_at):
+        """Atomically replace the persisted snapshot"""
+        data = json.dumps({'format': self.FORMAT, 'fetched_at': fetched_at, 'snapshot': self.dump(payload)},
+                          separators=(',', ':'))
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        write_file_atomically(self.path, gzip.compress(data.encode('utf-8'), compresslevel=6), durable=True)
+
+    def load(self):
+        """Return ``(payload, fetched_at)``, or None when missing, outdated or too old"""
+        try:
+            with open(self.path, 'rb') as f:
+                data = json.loads(gzip.decompress(f.read()))
+        except FileNotFoundError:
+            return None
+        if data.get('format') != self.FORMAT:
+            return None
+        if time.time() - data['fetched_at'] > self.max_age:
+            print(f"Discarding persisted snapshot {self.path}: older than {self.max_age}s", file=sys.stderr)
+            return None
+        return self.load_payload(data['snapshot']), data['fetched_at']
+
+class InventoryHistory:
+    """Change history of inventory snapshots, stored in SQLite as deltas plus periodic checkpoints
+
+    Each recorded version stores only the resources added, removed or changed
+    since the previous version of the same provider; every ``checkpoint_every``
+    versions the full resource set is stored as well, so reconstructing any
+    point in time replays at most that many deltas. Writes run in submission
+    order on one background thread per process; processes sharing the database
+    skip a version another one already recorded.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS versions (
+            id INTEGER PRIMARY KEY,
+            provider TEXT NOT NULL,
+            version TEXT NOT NULL,
+            recorded_at REAL NOT NULL,
+            checkpoint INTEGER NOT NULL,
+            resource_count INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS versions_by_time ON versions (provider, recorded_at);
+        CREATE TABLE IF NOT EXISTS changes (
+            version_id INTEGER NOT NULL REFERENCES versions (id) ON DELETE CASCADE,
+            kind TEXT NOT NULL,
+            resource_id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            type TEXT NOT NULL,
+            resource_group TEXT NOT NULL,
+            location TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS changes_by_version ON changes (version_id, kind);
+    """
+
+    def __init__(self, path, checkpoint_every, retention):
+        self.path = path
+        self.checkpoint_every = checkpoint_every
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._writer = None
+        self._pid = None
+        # provider -> (version, {resource_id: fingerprint}) of the last recorded version
+        self._last = {}
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA foreign_keys = ON')
+        return conn
+
+    def _setup(self):
+        """Create the schema and this process's writer thread on first use, returning the writer"""
+        # Per process: a forked worker can't use its parent's writer thread
+        with self._lock:
+            if self._pid != os.getpid():
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                with closing(self._connect()) as conn:
+                    conn.execute('PRAGMA journal_mode = WAL')
+                    conn.executescript(self.SCHEMA)
+                self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='history')
+                self._pid = os.getpid()
+                self._last = {}
+            return self._writer
+
+    def submit(self, provider, snapshot):
+        """Queue a newly installed snapshot for recording"""
+        self._setup().submit(self._record_safely, provider, snapshot, time.time())
+
+    def _record_safely(self, provider, snapshot, recorded_at):
+        try:
+            self.record(provider, snapshot, recorded_at)
+        except Exception as e:
+            print(f"Unable to record {provider} inventory history: {e}", file=sys.stderr)
+
+    def record(self, provider, snapshot, recorded_at):
+        """Store the delta between ``snapshot`` and the last recorded version, returning False if unchanged"""
+        current = {r.id: r for r in snapshot.resources}
+        with closing(self._connect()) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                latest = conn.execute('SELECT id, version FROM versions WHERE provider = ? ORDER BY id DESC LIMIT 1',
+                                      (provider,)).fetchone()
+                if latest is not None and latest[1] == snapshot.version:
+                    conn.execute('ROLLBACK')
+                    return False
+
+                rows = []
+                if latest is not None:
+                    previous = self._previous_state(conn, provider, latest)
+                    for resource_id, fields in previous.items():
+                        if resource_id not in current:
+                            rows.append(('removed', resource_id) + fields)
+                    for resource_id, resource in current.items():
+                        fields = resource.fingerprint()
+                        old = previous.get(resource_id)
+                        if old is None:
+                            rows.append(('added', resource_id) + fields)
+                        elif old != fields:
+                            rows.append(('changed', resource_id) + fields)
+                    since_checkpoint = conn.execute(
+                        'SELECT COUNT(*) FROM versions WHERE provider = ? AND id > '
+                        '(SELECT MAX(id) FROM versions WHERE provider = ? AND checkpoint = 1)',
+                        (provider, provider)).fetchone()[0]
+                checkpoint = latest is None or since_checkpoint + 1 >= self.checkpoint_every
+                if checkpoint:
+                    rows.extend(('checkpoint', resource_id) + resource.fingerprint()
+                                for resource_id, resource in current.items())
+
+                version_id = conn.execute(
+                    'INSERT INTO versions (provider, version, recorded_at, checkpoint, resource_count) VALUES (?, ?, ?, ?, ?)',
+                    (provider, snapshot.version, recorded_at, int(checkpoint), len(current))).lastrowid
+                conn.executemany('INSERT INTO changes VALUES (?, ?, ?, ?, ?, ?, ?)', ((version_id,) + row for row in rows))
+                self._prune(conn, provider, recorded_at - self.retention)
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        self._last[provider] = (snapshot.version, {resource_id: r.fingerprint() for resource_id, r in current.items()})
+        return True
+
+    def _previous_state(self, conn, provider, latest):
+        cached = self._last.get(provider)
+        if cached is not None and cached[0] == latest[1]:
+            return cached[1]
+        # Another process recorded since, or this one just started
+        return self._state_at(conn, provider, latest[0])
+
+    def _state_at(self, conn, provider, version_id):
+        """Replay deltas onto the closest checkpoint to rebuild ``{resource_id: fields}`` at a version"""
+        checkpoint_id = conn.execute(
+            'SELECT MAX(id) FROM versions WHERE provider = ? AND checkpoint = 1 AND id <= ?',
+            (provider, version_id)).fetchone()[0]
+        state = {}
+        rows = conn.execute(
+            "SELECT c.kind, c.resource_id, c.name, c.type, c.resource_group, c.location FROM changes c "
+            "JOIN versions v ON v.id = c.version_id WHERE v.provider = ? AND "
+            "((c.version_id = ? AND c.kind = 'checkpoint') OR (c.version_id > ? AND c.version_id <= ? AND c.kind != 'checkpoint')) "
+            "ORDER BY c.version_id",
+            (provider, checkpoint_id, checkpoint_id, version_id))
+        for kind, resource_id, *fields in rows:
+            if kind == 'removed':
+                state.pop(resource_id, None)
+            else:
+                state[resource_id] = tuple(fields)
+        return state
+
+    def _prune(self, conn, provider, cutoff):
+        # Keep the newest checkpoint before the cutoff so every later time can still be rebuilt
+        checkpoint_id = conn.execute(
+            'SELECT MAX(id) FROM versions WHERE provider = ? AND checkpoint = 1 AND recorded_at <= ?',
+            (provider, cutoff)).fetchone()[0]
+        if checkpoint_id is not None:
+            conn.execute('DELETE FROM versions WHERE provider = ? AND id < ?', (provider, checkpoint_id))
+
+    def inventory_at(self, provider, at):
+        """Return ``(version, recorded_at, resources)`` as of time ``at``, or None before the history starts"""
+        self._setup()
+        with closing(self._connect()) as conn:
+            conn.execute('BEGIN')
+            try:
+                row = conn.execute('SELECT MAX(id) FROM versions WHERE provider = ? AND recorded_at <= ?',
+                                   (provider, at)).fetchone()
+                if row[0] is None:
+                    return None
+                version, recorded_at = conn.execute('SELECT version, recorded_at FROM versions WHERE id = ?',
+                                                    (row[0],)).fetchone()
+                state = self._state_at(conn, provider, row[0])
+            finally:
+                conn.execute('COMMIT')
+        resources = [Resource(resource_id, *fields) for resource_id, fields in sorted(state.items())]
+        return version, recorded_at, resources
+
+    def changes_between(self, provider, since, until, limit):
+        """Return ``(versions, changes)`` recorded in ``[since, until]``, at most ``limit`` changes"""
+        self._setup()
+        with closing(self._connect()) as conn:
+            versions = conn.execute(
+                'SELECT version, recorded_at, resource_count FROM versions '
+                'WHERE provider = ? AND recorded_at >= ? AND recorded_at <= ? ORDER BY id',
+                (provider, since, until)).fetchall()
+            changes = conn.execute(
+                "SELECT v.version, v.recorded_at, c.kind, c.resource_id, c.name, c.type, c.resource_group, c.location "
+                "FROM changes c JOIN versions v ON v.id = c.version_id "
+                "WHERE v.provider = ? AND v.recorded_at >= ? AND v.recorded_at <= ? AND c.kind != 'checkpoint' "
+                "ORDER BY v.id, c.kind, c.resource_id LIMIT ?",
+                (provider, since, until, limit)).fetchall()
+        return versions, changes
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive flock on ``path``; a no-op when ``path`` is None"""
+    if path is None:
+        yield
+        return
+    with open(path, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def write_file_atomically(path, data, durable=False):
+    """Write ``data`` to a temporary file and rename it over ``path``
+
+    With ``durable`` the data is flushed to disk before the rename, so a crash
+    leaves either the old file or the complete new one.
+    """
+    fd, tmp_path = tempfile.mkstemp(prefix='.snapshot-', dir=os.path.dirname(path) or '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+class InventoryBroadcaster:
+    """Single background poller pushing inventory changes to every stream subscriber
+
+    The poller refreshes the cache when it goes stale, so one upstream fetch
+    serves all open pages. It runs only while at least one client is subscribed.
+    Streams hold a server thread each, so ``reserve`` admits at most
+    ``max_streams`` of them per process.
+    """
+
+    def __init__(self, cache, build_event, check_interval, max_streams):
+        self.cache = cache
+        self.build_event = build_event
+        self.check_interval = check_interval
+        self.max_streams = max_streams
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._streams = 0
+        self._thread = None
+        self._version = None
+
+    def subscribe(self):
+        """Register a subscriber and return the queue its events are delivered to"""
+        subscriber = queue.Queue(maxsize=8)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if self._thread is None:
+                entry = self.cache.peek()
+                self._version = entry['payload'].version if entry and entry['success'] else None
+                self._thread = threading.Thread(target=self._run, name='inventory-broadcaster', daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        """Remove a subscriber; the poller stops once none are left"""
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def reserve(self):
+        """Claim a stream slot, returning False when all ``max_streams`` are taken"""
+        with self._lock:
+            if self._streams >= self.max_streams:
+                return False
+            self._streams += 1
+            return True
+
+    def release(self):
+        """Give back a slot claimed with ``reserve``"""
+        with self._lock:
+            self._streams -= 1
+
+    def _run(self):
+        refresh_priority.set('background')
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    return
+            try:
+                entry = self.cache.peek()
+                if entry is None or self.cache.is_stale(entry) and self.cache.refresh_wait('background') == 0:
+                    entry = self.cache.refresh()
+                snapshot = entry['payload']
+                if entry['success'] and snapshot.version != self._version:
+                    self._publish(self.build_event(snapshot, self._version))
+                    self._version = snapshot.version
+            except Exception as e:
+                print(f"Inventory broadcaster error: {e}", file=sys.stderr)
+            time.sleep(self.check_interval)
+
+    def _publish(self, message):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                # A client that stopped reading is dropped; it reconnects and refetches.
+                # Never block here: one stalled client must not stop the poller.
+                self.unsubscribe(subscriber)
+                self._close(subscriber)
+
+    @staticmethod
+    def _close(subscriber):
+        # Replace the undelivered backlog with the end-of-stream sentinel
+        try:
+            while True:
+                subscriber.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            subscriber.put_nowait(None)
+        except queue.Full:
+            pass
+
+class SingleFlight:
+    """Coalesce concurrent calls sharing a key into one execution
+
+    Every caller that arrives while a call is in flight waits for it and receives
+    the same result, or the same exception.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """Run ``fn`` unless a call for ``key`` is already in flight, then share its outcome"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {'done': threading.Event(), 'result': None, 'error': None, 'shared': 0}
+            else:
+                call['shared'] += 1
+
+        if leader:
+            try:
+                call['result'] = fn()
+            except BaseException as e:
+                call['error'] = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call['done'].set()
+        else:
+            call['done'].wait()
+
+        if call['error'] is not None:
+            raise call['error']
+        return call['result']
+
+# Who a refresh is for: 'user' when a request waits on it, 'background' for
+# the refresh threads. Schedulers let user refreshes through first.
+refresh_priority = contextvars.ContextVar('refresh_priority', default='user')
+
+class InventoryCache:
+    """TTL-bounded inventory cache with stale-while-revalidate semantics
+
+    ``fetch`` returns a ``(payload, success)`` tuple. A failed fetch never
+    replaces the last good snapshot; it is only kept when nothing better exists.
+    With a SharedSnapshotStore, snapshots fetched by any process are adopted by
+    all of them and refreshes are serialized across processes. With a
+    PersistentSnapshotStore, good snapshots are saved to disk and ``restore``
+    serves the saved one, as stale, after a restart. ``on_update(payload,
+    restored)`` is called with every newly installed good payload; ``restored``
+    is True for the one installed by ``restore``. ``gate(priority)`` returns the
+    seconds until a refresh at that priority may run; while it is positive the
+    current entry is served and no refresh is started.
+    """
+
+    def __init__(self, name, fetch, ttl, max_stale, store=None, on_update=None, persist=None, gate=None):
+        self.name = name
+        self.fetch = fetch
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.store = store
+        self.on_update = on_update
+        self.persist = persist
+        self.gate = gate
+        self._lock = threading.Lock()
+        self._entry = None
+        self._last_error = None
+        self._refreshing = False
+
+    def get(self, force=False):
+        """Return the current entry, refreshing synchronously only when required"""
+        return self.lookup(force)[0]
+
+    def lookup(self, force=False):
+        """Like ``get``, but return ``(entry, result)`` with the hit, stale, throttled or miss result"""
+        self._adopt_stored()
+        with self._lock:
+            entry = self._entry
+        # A restored entry is kept until it is older than the persisted snapshot limit
+        max_stale = self.persist.max_age if entry is not None and entry.get('restored') else self.max_stale
+        if entry is None or force or time.time() - entry['fetched_at'] >= max_stale:
+            if entry is not None and self.refresh_wait('user') > 0:
+                # Refetching now would only spend upstream quota; keep serving what we have
+                metrics.inc('zt_cache_requests_total', cache=self.name, result='throttled')
+                return entry, 'throttled'
+            metrics.inc('zt_cache_requests_total', cache=self.name, result='miss')
+            return self.refresh(), 'miss'
+        if self.is_stale(entry):
+            metrics.inc('zt_cache_requests_total', cache=self.name, result='stale')
+            if self.refresh_wait('background') == 0:
+                self.refresh_in_background()
+            return entry, 'stale'
+        metrics.inc('zt_cache_requests_total', cache=self.name, result='hit')
+        return entry, 'hit'
+
+    def peek(self):
+        """Return the current entry, or None, without triggering any refresh"""
+        with self._lock:
+            return self._entry
+
+    def refresh_wait(self, priority):
+        """Seconds until the gate lets a refresh at ``priority`` run; always 0 without a gate"""
+        return self.gate(priority) if self.gate is not None else 0
+
+    def is_stale(self, entry):
+        """Return True when an entry is older than the TTL, restored from disk, or came from a failed fetch"""
+        return entry.get('restored', False) or not entry['success'] or time.time() - entry['fetched_at'] >= self.ttl
+
+    def refresh(self):
+        """Fetch a new snapshot and return the entry that should be served
+
+        With a shared store only one process fetches at a time; a process that
+        waited on another's fetch adopts its result instead of fetching again.
+        """
+        if self.store is None:
+            return self._fetch()
+        requested_at = time.time()
+        with self.store.refresh_lock():
+            self._adopt_stored()
+            with self._lock:
+                entry = self._entry
+            if entry is not None and entry['success'] and entry['fetched_at'] >= requested_at:
+                return entry
+            return self._fetch()
+
+    def _fetch(self):
+        payload, success = self.fetch()
+        now = time.time()
+        with self._lock:
+            if success:
+                self._entry = {'payload': payload, 'success': True, 'fetched_at': now}
+                self._last_error = None
+            else:
+                self._last_error = now
+                if self._entry is None or not self._entry['success']:
+                    self._entry = {'payload': payload, 'success': False, 'fetched_at': now}
+            entry = self._entry
+        if success:
+            self._installed(payload)
+            if self.store is not None:
+                try:
+                    self.store.save(payload, now)
+                except Exception as e:
+                    print(f"Unable to share {self.name} snapshot: {e}", file=sys.stderr)
+            if self.persist is not None:
+                try:
+                    self.persist.save(payload, now)
+                except Exception as e:
+                    print(f"Unable to persist {self.name} snapshot: {e}", file=sys.stderr)
+        return entry
+
+    def restore(self):
+        """Install the snapshot persisted by a previous run, marked stale, if there is one"""
+        if self.persist is None:
+            return False
+        try:
+            stored = self.persist.load()
+        except Exception as e:
+            print(f"Unable to read persisted {self.name} snapshot: {e}", file=sys.stderr)
+            return False
+        if stored is None:
+            return False
+        payload, fetched_at = stored
+        with self._lock:
+            if self._entry is not None:
+                return False
+            self._entry = {'payload': payload, 'success': True, 'fetched_at': fetched_at, 'restored': True}
+        self._installed(payload, restored=True)
+        return True
+
+    def _adopt_stored(self):
+        """Install a snapshot another process wrote to the shared store, if newer"""
+        if self.store is None:
+            return
+        try:
+            stored = self.store.load()
+        except Exception as e:
+            print(f"Unable to read shared {self.name} snapshot: {e}", file=sys.stderr)
+            return
+        if stored is None:
+            return
+        payload, fetched_at = stored
+        with self._lock:
+            if self._entry is not None and self._entry['success'] and self._entry['fetched_at'] >= fetched_at:
+                return
+            self._entry = {'payload': payload, 'success': True, 'fetched_at': fetched_at}
+            self._last_error = None
+        self._installed(payload)
+
+    def _installed(self, payload, restored=False):
+        if self.on_update is not None:
+            try:
+                self.on_update(payload, restored)
+            except Exception as e:
+                print(f"Error handling {self.name} update: {e}", file=sys.stderr)
+
+    def refresh_in_background(self):
+        """Start a background refresh unless one is already running"""
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            refresh_priority.set('background')
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Background refresh of {self.name} failed: {e}", file=sys.stderr)
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=run, name=f"{self.name}-refresh", daemon=True).start()
+
+    def describe(self, entry):
+        """Describe the age and freshness of an entry for API responses"""
+        age = max(0.0, time.time() - entry['fetched_at'])
+        with self._lock:
+            refreshing = self._refreshing
+            last_error = self._last_error
+        return {
+            'age': round(age, 1),
+            'ttl': self.ttl,
+            'fresh': not self.is_stale(entry),
+            'restored': entry.get('restored', False),
+            'refreshing': refreshing,
+            'fetched_at': datetime.fromtimestamp(entry['fetched_at'], timezone.utc).isoformat(),
+            'last_error_at': datetime.fromtimestamp(last_error, timezone.utc).isoformat() if last_error else None,
+        }
+
+def parse_retry_after(value):
+    """Seconds to wait according to a Retry-After header (delta-seconds or HTTP date), or None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def parse_quota_reset(value):
+    """Seconds in a Resource Graph ``x-ms-user-quota-resets-after`` header (hh:mm:ss), or None"""
+    try:
+        hours, minutes, seconds = value.split(':')
+        return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    except (AttributeError, ValueError):
+        return None
+
+class RefreshScheduler:
+    """Paces the inventory refreshes of each subscription around ARM throttling
+
+    A subscription is listed at most once every ``min_interval`` seconds,
+    whoever asks, and not at all until the Retry-After of a 429 has passed;
+    those are the only limits on user-initiated refreshes. Background refreshes
+    also follow the remaining-reads header of ARM responses: below ``low_water``
+    their interval stretches from ``base_interval`` towards ``max_interval``,
+    leaving the remaining quota to users. ``backoff`` is the pause after a 429
+    without Retry-After. Resource Graph queries are paced under their own key,
+    which an exhausted per-user quota holds back until it resets. With
+    ``state_path`` the state is shared by all worker processes, so the limits
+    hold for the whole server.
+    """
+
+    PRIORITIES = ('user', 'background')
+
+    # Response headers carrying the remaining read quota of the subscription
+    QUOTA_HEADERS = ('x-ms-ratelimit-remaining-subscription-reads',
+                     'x-ms-ratelimit-remaining-subscription-global-reads')
+
+    def __init__(self, base_interval, min_interval, low_water, max_interval, backoff, state_path=None):
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.low_water = low_water
+        self.max_interval = max(base_interval, max_interval)
+        self.backoff = backoff
+        self.state_path = state_path
+        self.lock_path = f"{state_path}.lock" if state_path else None
+        self._lock = threading.Lock()
+        self._state = {}
+        self._signature = None
+
+    def _load(self):
+        # Called with self._lock held; rereads the shared file only when it changed
+        if self.state_path is None:
+            return
+        try:
+            st = os.stat(self.state_path)
+        except FileNotFoundError:
+            return
+        signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if signature == self._signature:
+            return
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                self._state = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Unable to read refresh scheduler state: {e}", file=sys.stderr)
+            return
+        self._signature = signature
+
+    @contextmanager
+    def _update(self, key):
+        """Yield the state of ``key`` for modification and share it afterwards"""
+        with self._lock, file_lock(self.lock_path):
+            self._load()
+            yield self._state.setdefault(key, {})
+            if self.state_path is None:
+                return
+            try:
+                write_file_atomically(self.state_path, json.dumps(self._state, separators=(',', ':')).encode('utf-8'))
+                st = os.stat(self.state_path)
+                self._signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+            except OSError as e:
+                print(f"Unable to share refresh scheduler state: {e}", file=sys.stderr)
+
+    def _get(self, key):
+        with self._lock:
+            self._load()
+            return dict(self._state.get(key, {}))
+
+    def poll_interval(self, state):
+        """Background refresh interval for a subscription state, stretched as its read quota runs low"""
+        remaining = state.get('remaining')
+        if remaining is None or remaining >= self.low_water:
+            return self.base_interval
+        return min(self.max_interval, self.base_interval * self.low_water / max(remaining, 1))
+
+    def _wait(self, state, priority, now):
+        last = state.get('last_refresh', 0)
+        ready_at = max(state.get('throttled_until', 0), last + self.min_interval)
+        if priority == 'background':
+            ready_at = max(ready_at, last + self.poll_interval(state))
+        return max(0.0, ready_at - now)
+
+    def wait_time(self, key, priority='user'):
+        """Seconds until subscription ``key`` may be listed at ``priority``; 0 when it may be now"""
+        return self._wait(self._get(key), priority, time.time())
+
+    def started(self, key):
+        """Record that subscription ``key`` is being listed now"""
+        with self._update(key) as state:
+            state['last_refresh'] = time.time()
+
+    def observe(self, key, status, headers):
+        """Record the quota and throttling signals of an ARM response for subscription ``key``"""
+        remaining = [int(value) for value in (headers.get(name) for name in self.QUOTA_HEADERS)
+                     if value and value.strip().isdigit()]
+        hold = None
+        if status == 429:
+            hold = parse_retry_after(headers.get('Retry-After'))
+        elif (headers.get('x-ms-user-quota-remaining') or '').strip() == '0':
+            # Resource Graph answers with its own per-user quota, counted in queries
+            hold = parse_quota_reset(headers.get('x-ms-user-quota-resets-after'))
+        if not remaining and hold is None and status != 429:
+            return
+        now = time.time()
+        with self._update(key) as state:
+            if remaining:
+                state['remaining'] = min(remaining)
+                state['observed_at'] = now
+            if hold is not None or status == 429:
+                state['throttled_until'] = now + (self.backoff if hold is None else hold)
+        if remaining:
+            metrics.set('zt_arm_remaining_reads', min(remaining), subscription=key)
+        if status == 429:
+            metrics.inc('zt_arm_throttled_total', subscription=key)
+
+    def throttle(self, key, retry_after=None):
+        """Hold back subscription ``key`` after a throttling error without response headers"""
+        with self._update(key) as state:
+            state['throttled_until'] = time.time() + (self.backoff if retry_after is None else retry_after)
+        metrics.inc('zt_arm_throttled_total', subscription=key)
+
+    def describe(self, keys):
+        """Describe the throttling state of subscriptions ``keys`` for API responses"""
+        now = time.time()
+        subscriptions = {}
+        for key in keys:
+            state = self._get(key)
+            subscriptions[key] = {
+                'remaining_reads': state.get('remaining'),
+                'throttled_for': max(0, round(state.get('throttled_until', 0) - now)),
+                'poll_interval': round(self.poll_interval(state)),
+                'next_refresh_in': {priority: round(self._wait(state, priority, now)) for priority in self.PRIORITIES},
+            }
+        return subscriptions
+
+azure_refresh_scheduler = RefreshScheduler(
+    AZURE_CACHE_TTL, AZURE_REFRESH_MIN_INTERVAL, AZURE_QUOTA_LOW_WATER, AZURE_MAX_POLL_INTERVAL,
+    AZURE_THROTTLE_BACKOFF, state_path=f"{SHARED_SNAPSHOT_PATH}.refresh.json" if SHARED_SNAPSHOT_PATH else None)
+
+class AzureApiError(Exception):
+    """Error response returned by the Azure token or ARM endpoints"""
+
+    def __init__(self, status, message):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+
+class HttpConnectionPool:
+    """Pool of keep-alive HTTP(S) connections, reused per scheme and host"""
+
+    def __init__(self, max_idle, timeout):
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._idle = {}
+
+    def _acquire(self, key):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        scheme, netloc = key
+        connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        return connection_class(netloc, timeout=self.timeout), False
+
+    def _release(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def request(self, method, url, body=None, headers=None):
+        """Send a request and return ``(status, headers, body)``
+
+        A reused connection that the server has already closed is retried once
+        on a fresh connection.
+        """
+        parts = urllib.parse.urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        for attempt in range(2):
+            conn, reused = self._acquire(key)
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                response = conn.getresponse()
+                data = response.read()
+            except (http.client.HTTPException, OSError) as e:
+                conn.close()
+                if isinstance(e, TimeoutError):
+                    metrics.inc('zt_timeouts_total', operation='http')
+                elif reused and attempt == 0:
+                    continue
+                raise
+            if response.will_close:
+                conn.close()
+            else:
+                self._release(key, conn)
+            return response.status, response.headers, data
+
+class AzureArmClient:
+    """In-process Azure Resource Manager client authenticated as a service principal
+
+    ``observer(url, status, headers)``, if given, sees every ARM response.
+    """
+
+    # Renew the token this many seconds before it expires
+    TOKEN_EXPIRY_MARGIN = 300
+
+    def __init__(self, tenant_id, client_id, client_secret, authority_host, resource_manager, pool, observer=None):
+        self.tenant_id = tenant_id
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.authority_host = authority_host
+        self.resource_manager = resource_manager
+        self.pool = pool
+        self.observer = observer
+        self._token_lock = threading.Lock()
+        self._token = None
+        self._token_expires_at = 0.0
+        self._default_subscription = None
+
+    def get_token(self, force=False):
+        """Return a cached access token, requesting a new one when close to expiry"""
+        with self._token_lock:
+            if not force and self._token and time.time() < self._token_expires_at - self.TOKEN_EXPIRY_MARGIN:
+                return self._token
+            body = urllib.parse.urlencode({
+                'grant_type': 'client_credentials',
+                'client_id': self.client_id,
+                'client_secret': self.client_secret,
+                'scope': f"{self.resource_manager}/.default",
+            })
+            status, _, data = self.pool.request(
+                'POST', f"{self.authority_host}/{self.tenant_id}/oauth2/v2.0/token", body=body,
+                headers={'Content-Type': 'application/x-www-form-urlencoded'})
+            payload = json.loads(data or b'{}')
+            if status != 200 or 'access_token' not in payload:
+                raise AzureApiError(status, payload.get('error_description') or payload.get('error') or 'token request failed')
+            self._token = payload['access_token']
+            self._token_expires_at = time.time() + int(payload.get('expires_in', 3600))
+            return self._token
+
+    @property
+    def token_expires_at(self):
+        """Expiry time of the cached access token, 0 before the first one is acquired"""
+        return self._token_expires_at
+
+    def get_json(self, url):
+        """GET an ARM URL and decode the JSON body, renewing the token once on 401"""
+        return self.request_json('GET', url)
+
+    def request_json(self, method, url, body=None):
+        """Send an ARM request with an optional JSON body and decode the JSON response
+
+        The token is renewed and the request retried once on 401.
+        """
+        data = json.dumps(body) if body is not None else None
+        for attempt in range(2):
+            headers = {'Authorization': f"Bearer {self.get_token(force=attempt > 0)}", 'Accept': 'application/json'}
+            if data is not None:
+                headers['Content-Type'] = 'application/json'
+            with timed_stage('arm_request'):
+                status, response_headers, response_data = self.pool.request(method, url, body=data, headers=headers)
+            if self.observer is not None:
+                self.observer(url, status, response_headers)
+            if status == 401 and attempt == 0:
+                continue
+            payload = json.loads(response_data or b'{}')
+            if status != 200:
+                error = payload.get('error') or {}
+                raise AzureApiError(status, error.get('message') or error.get('code') or 'request failed')
+            return payload
+
+    def iter_pages(self, url):
+        """Yield the ``value`` items of a paged ARM collection, following ``nextLink``"""
+        while url:
+            payload = self.get_json(url)
+            yield from payload.get('value', [])
+            url = payload.get('nextLink')
+
+    @property
+    def known_default_subscription(self):
+        """The default subscription if it was already looked up, else None"""
+        return self._default_subscription
+
+    def default_subscription(self):
+        """Return the first enabled subscription visible to the service principal"""
+        if self._default_subscription is None:
+            for subscription in self.iter_pages(f"{self.resource_manager}/subscriptions?api-version=2020-01-01"):
+                if subscription.get('state', 'Enabled') == 'Enabled':
+                    self._default_subscription = subscription['subscriptionId']
+                    break
+            else:
+                raise AzureApiError(404, 'no enabled subscription found')
+        return self._default_subscription
+
+    def list_resources(self, subscription_id=None, resource_group=None):
+        """Return every resource in the subscription, or one of its resource groups, as Resource records"""
+        subscription_id = subscription_id or self.default_subscription()
+        scope = f"/subscriptions/{subscription_id}"
+        if resource_group:
+            scope += f"/resourceGroups/{urllib.parse.quote(resource_group)}"
+        url = f"{self.resource_manager}{scope}/resources?api-version=2021-04-01"
+        return [Resource(item.get('id', ''), item.get('name', ''), item.get('type', ''),
+                         resource_group_from_id(item.get('id', '')), item.get('location', ''))
+                for item in self.iter_pages(url)]
+
+    def query_resource_graph(self, query, subscriptions):
+        """Run a Resource Graph query over ``subscriptions`` and return every row, following skip tokens"""
+        return run_resource_graph_query(
+            lambda body: self.request_json('POST', f"{self.resource_manager}{RESOURCE_GRAPH_PATH}", body),
+            query, subscriptions)
+
+# Resource Graph endpoint, shared by the native client and 'az rest', and the
+# refresh scheduler key its queries are paced under
+RESOURCE_GRAPH_PATH = '/providers/Microsoft.ResourceGraph/resources?api-version=2021-03-01'
+RESOURCE_GRAPH_KEY = 'resource-graph'
+
+def run_resource_graph_query(post, query, subscriptions):
+    """Page through a Resource Graph query, calling ``post(body)`` for each page"""
+    body = {'subscriptions': subscriptions, 'query': query, 'options': {'resultFormat': 'objectArray', '$top': 1000}}
+    rows = []
+    while True:
+        payload = post(body)
+        rows.extend(payload.get('data') or [])
+        token = payload.get('$skipToken')
+        if not token:
+            return rows
+        body['options']['$skipToken'] = token
+
+def resource_group_from_id(resource_id):
+    """Extract the resource group name from an ARM resource ID"""
+    parts = resource_id.split('/')
+    for i, part in enumerate(parts[:-1]):
+        if part.lower() == 'resourcegroups':
+            return parts[i + 1]
+    return ''
+
+def create_azure_arm_client():
+    """Create the native ARM client when service principal credentials are configured"""
+    if AZURE_CLIENT_MODE == 'cli':
+        return None
+    if 'Not set' in (AZURE_TENANT_ID, AZURE_CLIENT_ID, AZURE_PASSWORD):
+        return None
+    pool = HttpConnectionPool(AZURE_ARM_POOL_SIZE, AZURE_ARM_TIMEOUT)
+    return AzureArmClient(AZURE_TENANT_ID, AZURE_CLIENT_ID, AZURE_PASSWORD,
+                          AZURE_AUTHORITY_HOST, AZURE_RESOURCE_MANAGER, pool, observer=observe_arm_response)
+
+def observe_arm_response(url, status, headers):
+    """Pass the throttling signals of subscription-scoped and Resource Graph responses to the refresh scheduler"""
+    path = urllib.parse.urlsplit(url).path
+    parts = path.split('/')
+    if len(parts) > 2 and parts[1].lower() == 'subscriptions' and parts[2]:
+        azure_refresh_scheduler.observe(parts[2], status, headers)
+    elif path.lower() == RESOURCE_GRAPH_PATH.split('?')[0].lower():
+        azure_refresh_scheduler.observe(RESOURCE_GRAPH_KEY, status, headers)
+
+azure_arm_client = create_azure_arm_client()
+
+class CliBusyError(Exception):
+    """Raised when a CLI command is rejected because the executor's wait queue is full"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Azure CLI executor is busy, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+class CliExecutor:
+    """Run CLI commands with bounded concurrency and a bounded wait queue
+
+    Commands beyond ``max_concurrency`` wait for a slot; once ``max_queue``
+    callers are waiting, or a slot doesn't free up within ``queue_timeout``,
+    further calls fail fast with CliBusyError. Each command runs in its own
+    session so a timeout kills the whole process tree.
+    """
+
+    def __init__(self, max_concurrency, max_queue, queue_timeout):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._stats = {'running': 0, 'waiting': 0, 'completed': 0, 'rejected': 0, 'timed_out': 0,
+                       'wait_seconds_total': 0.0, 'wait_seconds_max': 0.0, 'run_seconds_total': 0.0}
+
+    def stats(self):
+        """Return queue depth, wait time and outcome counters"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['max_concurrency'] = self.max_concurrency
+        stats['max_queue'] = self.max_queue
+        return stats
+
+    def _retry_after(self):
+        with self._lock:
+            completed = self._stats['completed']
+            average = self._stats['run_seconds_total'] / completed if completed else 5
+        return max(1, int(round(average)))
+
+    def _acquire(self):
+        if self._slots.acquire(blocking=False):
+            return 0.0
+        with self._lock:
+            if self._stats['waiting'] >= self.max_queue:
+                self._stats['rejected'] += 1
+                rejected = True
+            else:
+                self._stats['waiting'] += 1
+                rejected = False
+        if rejected:
+            raise CliBusyError(self._retry_after())
+
+        started = time.monotonic()
+        acquired = self._slots.acquire(timeout=self.queue_timeout)
+        waited = time.monotonic() - started
+        with self._lock:
+            self._stats['waiting'] -= 1
+            self._stats['wait_seconds_total'] += waited
+            self._stats['wait_seconds_max'] = max(self._stats['wait_seconds_max'], waited)
+            if not acquired:
+                self._stats['rejected'] += 1
+        if not acquired:
+            raise CliBusyError(self._retry_after())
+        return waited
+
+    def run(self, args, timeout):
+        """Run a command and return a CompletedProcess with text stdout and stderr"""
+        self._acquire()
+        with self._lock:
+            self._stats['running'] += 1
+        started = time.monotonic()
+        try:
+            with timed_stage('cli_command'):
+                proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                        text=True, start_new_session=True)
+                try:
+                    stdout, stderr = proc.communicate(timeout=timeout)
+                except BaseException as e:
+                    # Kill the whole process group: az runs as a wrapper around python
+                    try:
+                        os.killpg(proc.pid, signal.SIGKILL)
+                    except ProcessLookupError:
+                        pass
+                    proc.communicate()
+                    if isinstance(e, subprocess.TimeoutExpired):
+                        metrics.inc('zt_timeouts_total', operation='cli')
+                        with self._lock:
+                            self._stats['timed_out'] += 1
+                    raise
+            return subprocess.CompletedProcess(args, proc.returncode, stdout, stderr)
+        finally:
+            with self._lock:
+                self._stats['running'] -= 1
+                self._stats['completed'] += 1
+                self._stats['run_seconds_total'] += time.monotonic() - started
+            self._slots.release()
+
+azure_cli_executor = CliExecutor(AZURE_CLI_MAX_CONCURRENCY, AZURE_CLI_MAX_QUEUE, AZURE_CLI_QUEUE_TIMEOUT)
+azure_cli_logged_in = False
+
 def perform_azure_login():
+    """Authenticate the service principal, natively when possible and via the Azure CLI otherwise
+
+    Returns ``(method, expires_at)``; raises when no method succeeded.
+    """
+    if azure_arm_client is not None:
+        try:
+            azure_arm_client.get_token(force=True)
+            print("Azure service principal token acquired")
+            return 'native', azure_arm_client.token_expires_at
+        except Exception as e:
+            print(f"Native Azure login failed: {e}", file=sys.stderr)
+            metrics.inc('zt_login_failures_total', method='native')
+            if AZURE_CLIENT_MODE == 'native':
+                raise
+    if not perform_azure_cli_login():
+        raise RuntimeError('Azure CLI login failed')
+    return 'cli', read_azure_cli_token_expiry()
+
+# Serializes CLI logins; reentrant so a listing that finds the CLI logged out can log it in.
+# Worker processes share the CLI profile on disk, so they also take a file lock.
+azure_cli_login_lock = threading.RLock()
+AZURE_CLI_LOGIN_LOCK_PATH = f"{SHARED_SNAPSHOT_PATH}.login.lock" if SHARED_SNAPSHOT_PATH else None
+
+def perform_azure_cli_login():
     """Perform Azure CLI login using service principal"""
+    with azure_cli_login_lock, file_lock(AZURE_CLI_LOGIN_LOCK_PATH):
+        if run_azure_cli_login():
+            return True
+    metrics.inc('zt_login_failures_total', method='cli')
+    return False
+
+def run_azure_cli_login():
+    """Check that the Azure CLI is installed and log it in, returning True on success"""
+    global azure_cli_logged_in
     try:
-        # Check if Azure CLI is available
-        result = subprocess.run(['az', '--version'], capture_output=True, text=True)
-        if result.returncode != 0:
-            print("Azure CLI not found or not working", file=sys.stderr)
+        # Detect the CLI on PATH; running 'az --version' costs seconds of start-up
+        if shutil.which('az') is None:
+            print("Azure CLI not found", file=sys.stderr)
             return False
         
         # Perform login
@@ -43,9 +1848,10 @@ def perform_azure_login():
             '--tenant', AZURE_TENANT_ID
         ]
         
-        result = subprocess.run(login_cmd, capture_output=True, text=True)
+        result = azure_cli_executor.run(login_cmd, timeout=AZURE_CLI_TIMEOUT * 2)
         if result.returncode == 0:
             print("Azure CLI login successful")
+            azure_cli_logged_in = True
             return True
         else:
             print(f"Azure CLI login failed: {result.stderr}", file=sys.stderr)
@@ -54,154 +1860,693 @@ def perform_azure_login():
         print(f"Error during Azure CLI login: {e}", file=sys.stderr)
         return False
 
-def generate_azure_diagram():
-    """Generate Azure resource information with simple diagram"""
+def read_azure_cli_token_expiry():
+    """Return when the CLI's access token expires, or an AZURE_CLI_SESSION_TTL estimate when az can't tell"""
     try:
-        # Get Azure resources using Azure CLI
-        result = subprocess.run([
-            'az', 'resource', 'list', 
-            '--output', 'table',
-            '--query', '[].{Name:name, Type:type, ResourceGroup:resourceGroup, Location:location}'
-        ], capture_output=True, text=True, timeout=30)
-        
+        result = azure_cli_executor.run(['az', 'account', 'get-access-token', '--output', 'json'],
+                                        timeout=AZURE_CLI_TIMEOUT)
         if result.returncode == 0:
-            # Parse resources and create both table and diagram
-            resources_text = result.stdout
-            table_html = create_azure_resources_html(resources_text)
-            diagram_html = create_azure_diagram_svg(resources_text)
-            return f"{diagram_html}{table_html}"
+            token = json.loads(result.stdout)
+            if token.get('expires_on'):
+                return float(token['expires_on'])
+            # Older CLI versions only report a naive local time
+            return datetime.strptime(token['expiresOn'], '%Y-%m-%d %H:%M:%S.%f').timestamp()
+        print(f"Unable to read Azure CLI token expiry: {result.stderr}", file=sys.stderr)
+    except Exception as e:
+        print(f"Unable to read Azure CLI token expiry: {e}", file=sys.stderr)
+    return time.time() + AZURE_CLI_SESSION_TTL
+
+# Fragments of az error output meaning the CLI session is missing or expired;
+# kept specific, since other errors mention expired SAS tokens or resources
+AZURE_CLI_AUTH_ERRORS = ('az login', 'AADSTS', 'token has expired', 'Token has expired', 'ExpiredAuthenticationToken')
+
+# Azure CLI error output that means ARM throttled the request
+AZURE_CLI_THROTTLE_ERRORS = ('TooManyRequests', 'Too Many Requests')
+
+class CredentialManager:
+    """Keeps the Azure service principal signed in from a background thread
+
+    Logs in on start, then renews the credentials ``margin`` seconds before they
+    expire, so requests never wait on a login. Failed logins are retried with
+    jittered exponential backoff, and requests that see their credentials
+    rejected can ask for an early renewal with ``invalidate``. ``state`` is
+    'pending' before start, 'running' during the first login, then 'ready',
+    'refreshing' or 'failed'; 'disabled' when no service principal is configured.
+    """
+
+    def __init__(self, enabled, margin, backoff_min, backoff_max, on_recovered=None):
+        self.state = 'pending' if enabled else 'disabled'
+        self.margin = margin
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        self.on_recovered = on_recovered
+        self.method = None
+        self.expires_at = None
+        self.refreshed_at = None
+        self.next_refresh_at = None
+        self.failures = 0
+        self.last_error = None
+        # Set once the first login attempt finished, whatever its outcome
+        self.first_attempt = threading.Event()
+        self._wake = threading.Event()
+        self._invalidated = set()
+        self._lock = threading.Lock()
+        self._pid = None
+        if not enabled:
+            self.first_attempt.set()
+
+    def start(self):
+        """Start the renewal thread unless it already runs in this process"""
+        if self.state == 'disabled' or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.state = 'running'
+        threading.Thread(target=self._run, name='azure-credentials', daemon=True).start()
+
+    def _run(self):
+        while True:
+            self._wake.clear()
+            ok = self.refresh()
+            self.first_attempt.set()
+            if ok:
+                delay = max(self.backoff_min, self.expires_at - self.margin - time.time())
+            else:
+                delay = self.backoff_delay()
+            self.next_refresh_at = time.time() + delay
+            self._wake.wait(delay)
+
+    def refresh(self):
+        """Log in again and record the new expiry, returning True on success"""
+        recovering = self.state == 'failed'
+        if self.state != 'running':
+            self.state = 'refreshing'
+        with self._lock:
+            invalidated, self._invalidated = self._invalidated, set()
+        try:
+            method, expires_at = perform_azure_login()
+            if method == 'native' and 'cli' in invalidated:
+                # The CLI fallback's session was rejected too; renew it alongside the token
+                perform_azure_cli_login()
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            self.state = 'failed'
+            metrics.inc('zt_credential_refreshes_total', result='failure')
+            print(f"Azure credential refresh failed ({self.failures} in a row): {e}", file=sys.stderr)
+            return False
+        self.method = method
+        self.expires_at = expires_at
+        self.refreshed_at = time.time()
+        self.failures = 0
+        self.last_error = None
+        self.state = 'ready'
+        metrics.inc('zt_credential_refreshes_total', result='success')
+        if recovering and self.on_recovered is not None:
+            self.on_recovered()
+        return True
+
+    def backoff_delay(self):
+        """Return the delay before the next login attempt after ``failures`` consecutive failures"""
+        ceiling = min(self.backoff_max, self.backoff_min * 2 ** (self.failures - 1))
+        # Jitter keeps workers and replicas from retrying in lockstep, within the configured bounds
+        return random.uniform(max(self.backoff_min, ceiling / 2), ceiling)
+
+    def invalidate(self, method):
+        """Renew credentials early because a request saw the ``method`` session rejected"""
+        if self.state == 'disabled' or self._pid != os.getpid():
+            return
+        # A renewal that just happened can't be fixed by another one
+        if self.refreshed_at is not None and time.time() - self.refreshed_at < self.backoff_min:
+            return
+        with self._lock:
+            self._invalidated.add(method)
+        self._wake.set()
+
+    def pending(self):
+        """Return True while the first login has not finished yet"""
+        return self.state in ('pending', 'running')
+
+    def valid(self):
+        """Return True when requests can expect to authenticate"""
+        return self.state == 'disabled' or (self.expires_at is not None and time.time() < self.expires_at)
+
+    def describe(self):
+        """Return the credential state reported by the API and the readiness probe"""
+        now = time.time()
+        return {
+            'state': self.state,
+            'valid': self.valid(),
+            'method': self.method,
+            'expires_in': round(self.expires_at - now) if self.expires_at else None,
+            'next_refresh_in': max(0, round(self.next_refresh_at - now)) if self.next_refresh_at else None,
+            'refreshed_at': datetime.fromtimestamp(self.refreshed_at, timezone.utc).isoformat() if self.refreshed_at else None,
+            'failures': self.failures,
+            'error': self.last_error,
+        }
+
+def azure_inventory_sources():
+    """Return the ``(subscription, resource_group)`` pairs to list; None means default or all"""
+    subscriptions = AZURE_SUBSCRIPTIONS or [None]
+    sources = []
+    for group in AZURE_RESOURCEGROUPS or ['*']:
+        if '/' in group:
+            sources.append(tuple(group.split('/', 1)))
         else:
-            print(f"Azure CLI resource list failed: {result.stderr}", file=sys.stderr)
-            return create_azure_fallback_html()
-            
+            sources.extend((subscription, None if group == '*' else group) for subscription in subscriptions)
+    return list(dict.fromkeys(sources))
+
+def describe_azure_throttling(held_back=0):
+    """Refresh scheduler state for API responses; ``held_back`` is the wait of a held-back refresh"""
+    keys = sorted({azure_subscription_key(subscription) for subscription, _ in azure_inventory_sources()})
+    if AZURE_RELATIONSHIPS:
+        keys.append(RESOURCE_GRAPH_KEY)
+    return {
+        'deferred': held_back > 0,
+        'retry_after': math.ceil(held_back),
+        'subscriptions': azure_refresh_scheduler.describe(keys),
+    }
+
+def azure_subscription_key(subscription):
+    """Refresh scheduler key of a subscription; None means the default one, by ID once known"""
+    if subscription:
+        return subscription
+    if azure_arm_client is not None and azure_arm_client.known_default_subscription:
+        return azure_arm_client.known_default_subscription
+    return 'default'
+
+def azure_refresh_wait(priority):
+    """Seconds until at least one configured subscription may be listed at ``priority``"""
+    keys = {azure_subscription_key(subscription) for subscription, _ in azure_inventory_sources()}
+    return min(azure_refresh_scheduler.wait_time(key, priority) for key in keys)
+
+def previous_azure_source(snapshot, subscription, group):
+    """Resources of one source in a previous snapshot, or None when it doesn't hold them"""
+    key = azure_subscription_key(subscription)
+    if snapshot is None or key == 'default':
+        return None
+    reported = next((entry for entry in snapshot.sources or ()
+                     if (entry['subscription'], entry['resourceGroup']) == (subscription or 'default', group or '*')), None)
+    if reported is None or reported['error']:
+        return None
+    prefix = f"/subscriptions/{key}/".lower()
+    if group:
+        prefix += f"resourcegroups/{group}/".lower()
+    return [resource for resource in snapshot.resources if resource.id.lower().startswith(prefix)]
+
+def list_azure_inventory():
+    """List every configured source concurrently and merge the results
+
+    Returns ``(resources, sources)`` where ``sources`` reports the resource count
+    or error for each subscription and resource group. Sources of a subscription
+    the refresh scheduler holds back are not listed: they keep their resources
+    from the current snapshot and are reported as ``deferred``, or as failed when
+    it has none. Raises only when every source failed, re-raising CliBusyError
+    if that was among the causes.
+    """
+    sources = azure_inventory_sources()
+    if azure_arm_client is not None and any(subscription is None for subscription, _ in sources):
+        # Key the default subscription by its ID from the first fetch on; listing it needs the ID anyway
+        try:
+            azure_arm_client.default_subscription()
+        except Exception as e:
+            print(f"Unable to resolve the default subscription: {e}", file=sys.stderr)
+    priority = refresh_priority.get()
+    entry = azure_inventory_cache.peek()
+    snapshot = entry['payload'] if entry is not None and entry['success'] else None
+    waits = {}
+    for subscription, _ in sources:
+        key = azure_subscription_key(subscription)
+        if key not in waits:
+            waits[key] = azure_refresh_scheduler.wait_time(key, priority)
+    listed = [source for source in sources if not waits[azure_subscription_key(source[0])]]
+    for key in {azure_subscription_key(subscription) for subscription, _ in listed}:
+        azure_refresh_scheduler.started(key)
+    with ThreadPoolExecutor(max_workers=max(1, min(AZURE_FANOUT_WORKERS, len(listed))),
+                            thread_name_prefix='azure-fanout') as pool:
+        futures = {source: pool.submit(list_azure_resources, *source) for source in listed}
+
+    merged = {}
+    report = []
+    errors = []
+    for subscription, group in sources:
+        entry = {'subscription': subscription or 'default', 'resourceGroup': group or '*', 'count': 0, 'error': None}
+        future = futures.get((subscription, group))
+        try:
+            if future is None:
+                wait = math.ceil(waits[azure_subscription_key(subscription)])
+                metrics.inc('zt_refreshes_deferred_total', priority=priority)
+                resources = previous_azure_source(snapshot, subscription, group)
+                if resources is None:
+                    raise RuntimeError(f"held back for {wait}s to stay within Azure API limits")
+                entry['deferred'] = wait
+            else:
+                resources = future.result()
+        except Exception as e:
+            print(f"Listing {entry['subscription']}/{entry['resourceGroup']} failed: {e}", file=sys.stderr)
+            entry['error'] = str(e)
+            errors.append(e)
+        else:
+            entry['count'] = len(resources)
+            for resource in resources:
+                merged.setdefault(resource.id.lower(), resource)
+        report.append(entry)
+
+    if errors and len(errors) == len(sources):
+        raise next((e for e in errors if isinstance(e, CliBusyError)), errors[0])
+    return list(merged.values()), report
+
+def is_azure_throttled(error):
+    """True when a native client error is a 429, which the refresh scheduler has already recorded"""
+    return isinstance(error, AzureApiError) and error.status == 429
+
+def list_azure_resources(subscription=None, resource_group=None):
+    """Return Azure resource records for one source, preferring the native ARM client over the CLI"""
+    if azure_arm_client is not None:
+        try:
+            return azure_arm_client.list_resources(subscription, resource_group)
+        except Exception as e:
+            print(f"Native ARM resource listing failed: {e}", file=sys.stderr)
+            if isinstance(e, AzureApiError) and e.status == 401:
+                azure_credentials.invalidate('native')
+            # The CLI shares the throttled quota, so only hand it transport and auth failures
+            if AZURE_CLIENT_MODE == 'native' or is_azure_throttled(e):
+                raise
+    return list_azure_resources_cli(subscription, resource_group)
+
+def list_azure_resources_cli(subscription=None, resource_group=None):
+    """Return Azure resource records for one source using the Azure CLI"""
+    # The CLI session is only set up on demand when the native client handled login
+    with azure_cli_login_lock:
+        if not azure_cli_logged_in and AZURE_CLIENT_ID != 'Not set':
+            perform_azure_cli_login()
+
+    command = [
+        'az', 'resource', 'list', 
+        '--output', 'json',
+        '--query', AZURE_RESOURCE_QUERY
+    ]
+    if subscription:
+        command += ['--subscription', subscription]
+    if resource_group:
+        command += ['--resource-group', resource_group]
+    result = azure_cli_executor.run(command, timeout=AZURE_CLI_TIMEOUT)
+    if result.returncode != 0:
+        if any(fragment in result.stderr for fragment in AZURE_CLI_AUTH_ERRORS):
+            azure_credentials.invalidate('cli')
+        if any(fragment in result.stderr for fragment in AZURE_CLI_THROTTLE_ERRORS):
+            azure_refresh_scheduler.throttle(azure_subscription_key(subscription))
+        raise RuntimeError(f"Azure CLI resource list failed: {result.stderr}")
+    return parse_azure_json(result.stdout)
+
+@timed_stage('parse')
+def parse_azure_json(resources_json):
+    """Parse the JSON emitted for AZURE_RESOURCE_QUERY into Resource records"""
+    return [Resource(item.get('id') or '', item.get('name') or '', item.get('type') or '',
+                     item.get('resourceGroup') or '', item.get('location') or '')
+            for item in json.loads(resources_json or '[]')]
+
+# Resource Graph query for the properties relationships are derived from; only
+# types that reference other resources are needed
+AZURE_RELATIONSHIP_QUERY = """Resources
+| where type in~ ('microsoft.compute/virtualmachines', 'microsoft.compute/disks', 'microsoft.network/networkinterfaces', 'microsoft.network/virtualnetworks', 'microsoft.network/loadbalancers')
+| project id, type, managedBy, properties"""
+
+def azure_relationship_query(sources):
+    """AZURE_RELATIONSHIP_QUERY limited to the resource groups of ``sources`` when none spans a whole subscription"""
+    groups = sorted({group for _, group in sources if group})
+    if not groups or any(group is None for _, group in sources):
+        return AZURE_RELATIONSHIP_QUERY
+    quoted = ', '.join("'{}'".format(group.replace('\\', '\\\\').replace("'", "\\'")) for group in groups)
+    # Filter ahead of the final project, which drops the resourceGroup column
+    filters, projection = AZURE_RELATIONSHIP_QUERY.rsplit('\n', 1)
+    return f"{filters}\n| where resourceGroup in~ ({quoted})\n{projection}"
+
+def list_azure_relationship_rows(subscriptions):
+    """Return Resource Graph rows for the relationship query, preferring the native ARM client over the CLI"""
+    query = azure_relationship_query(azure_inventory_sources())
+    if azure_arm_client is not None:
+        try:
+            return azure_arm_client.query_resource_graph(query, subscriptions)
+        except Exception as e:
+            print(f"Native Resource Graph query failed: {e}", file=sys.stderr)
+            if AZURE_CLIENT_MODE == 'native' or is_azure_throttled(e):
+                raise
+    return run_resource_graph_query(post_resource_graph_cli, query, subscriptions)
+
+def post_resource_graph_cli(body):
+    """Send one Resource Graph request through 'az rest', which needs no CLI extension"""
+    command = [
+        'az', 'rest', '--method', 'post',
+        '--url', f"{AZURE_RESOURCE_MANAGER}{RESOURCE_GRAPH_PATH}",
+        '--body', json.dumps(body),
+        '--output', 'json'
+    ]
+    result = azure_cli_executor.run(command, timeout=AZURE_CLI_TIMEOUT)
+    if result.returncode != 0:
+        if any(fragment in result.stderr for fragment in AZURE_CLI_THROTTLE_ERRORS):
+            azure_refresh_scheduler.throttle(RESOURCE_GRAPH_KEY)
+        raise RuntimeError(f"Azure CLI Resource Graph query failed: {result.stderr}")
+    return json.loads(result.stdout or '{}')
+
+def parent_resource_id(resource_id):
+    """Strip the last child segment, e.g. a subnet ID to its virtual network ID"""
+    return resource_id.rsplit('/', 2)[0] if resource_id.count('/') > 2 else ''
+
+def extract_azure_relationships(row):
+    """Return the ``(source, target, label)`` edges, with lower-cased IDs, implied by one row's properties
+
+    Edges point from the dependent resource to what it is attached to:
+    VM -> NIC -> virtual network (labelled with the subnet), disk -> VM,
+    public IP -> NIC or load balancer, load balancer -> NIC, NSG -> NIC or
+    virtual network, and virtual network -> peered network.
+    """
+    def ref(value):
+        return value.get('id', '').lower() if isinstance(value, dict) else ''
+
+    resource_id = row.get('id', '').lower()
+    resource_type = row.get('type', '').lower()
+    properties = row.get('properties') or {}
+    edges = []
+    if resource_type == 'microsoft.compute/virtualmachines':
+        for nic in (properties.get('networkProfile') or {}).get('networkInterfaces') or []:
+            edges.append((resource_id, ref(nic), 'network interface'))
+        storage = properties.get('storageProfile') or {}
+        for disk in [storage.get('osDisk') or {}] + (storage.get('dataDisks') or []):
+            edges.append((ref(disk.get('managedDisk')), resource_id, 'disk'))
+    elif resource_type == 'microsoft.compute/disks':
+        if row.get('managedBy'):
+            edges.append((resource_id, row['managedBy'].lower(), 'disk'))
+    elif resource_type == 'microsoft.network/networkinterfaces':
+        for config in properties.get('ipConfigurations') or []:
+            config_properties = config.get('properties') or {}
+            subnet = ref(config_properties.get('subnet'))
+            if subnet:
+                edges.append((resource_id, parent_resource_id(subnet), f"subnet {subnet.rsplit('/', 1)[-1]}"))
+            edges.append((ref(config_properties.get('publicIPAddress')), resource_id, 'public IP'))
+            for pool in config_properties.get('loadBalancerBackendAddressPools') or []:
+                edges.append((parent_resource_id(ref(pool)), resource_id, 'backend pool'))
+        edges.append((ref(properties.get('networkSecurityGroup')), resource_id, 'security group'))
+    elif resource_type == 'microsoft.network/virtualnetworks':
+        for subnet in properties.get('subnets') or []:
+            security_group = ref((subnet.get('properties') or {}).get('networkSecurityGroup'))
+            edges.append((security_group, resource_id, f"subnet {subnet.get('name', '')}"))
+        for peering in properties.get('virtualNetworkPeerings') or []:
+            edges.append((resource_id, ref((peering.get('properties') or {}).get('remoteVirtualNetwork')), 'peering'))
+    elif resource_type == 'microsoft.network/loadbalancers':
+        for frontend in properties.get('frontendIPConfigurations') or []:
+            edges.append((ref((frontend.get('properties') or {}).get('publicIPAddress')), resource_id, 'frontend IP'))
+    return [edge for edge in edges if edge[0] and edge[1]]
+
+@timed_stage('relationships')
+def resolve_azure_relationships(resources, listed=True):
+    """Return the sorted ``(source_id, target_id, label)`` edges between listed resources
+
+    Relationship lookup is best effort. The Resource Graph query is paced by
+    the refresh scheduler and skipped when no subscription was ``listed``
+    afresh; then, or when it fails, the current snapshot's edges are kept.
+    """
+    ids = {resource.id.lower(): resource.id for resource in resources}
+    subscriptions = sorted({resource_id.split('/')[2] for resource_id in ids if resource_id.startswith('/subscriptions/')})
+    if not subscriptions:
+        return []
+    if not listed or azure_refresh_scheduler.wait_time(RESOURCE_GRAPH_KEY, refresh_priority.get()) > 0:
+        return previous_azure_edges(ids)
+    azure_refresh_scheduler.started(RESOURCE_GRAPH_KEY)
+    try:
+        rows = list_azure_relationship_rows(subscriptions)
+    except Exception as e:
+        print(f"Resolving Azure resource relationships failed: {e}", file=sys.stderr)
+        return previous_azure_edges(ids)
+
+    edges = {}
+    for source, target, label in (edge for row in rows for edge in extract_azure_relationships(row)):
+        if source in ids and target in ids and source != target:
+            edges.setdefault((ids[source], ids[target]), label)
+    return sorted((source, target, label) for (source, target), label in edges.items())
+
+def previous_azure_edges(ids):
+    """Edges of the current snapshot between resources in ``ids`` (lower-cased ID -> ID)"""
+    entry = azure_inventory_cache.peek()
+    if entry is None or not entry['success']:
+        return []
+    return [(ids[source.lower()], ids[target.lower()], label) for source, target, label in entry['payload'].edges
+            if source.lower() in ids and target.lower() in ids]
+
+def generate_azure_diagram():
+    """Fetch Azure resources and build the snapshot the diagram and table render from
+
+    Returns an ``(InventorySnapshot, success)`` tuple; the resources are parsed
+    once here and everything rendered from them is kept on the snapshot.
+    Raises CliBusyError when the CLI executor rejects the call.
+    """
+    try:
+        with tracked_fetch('azure'):
+            resources, sources = list_azure_inventory()
+            listed = any(not source['error'] and 'deferred' not in source for source in sources)
+            edges = resolve_azure_relationships(resources, listed) if AZURE_RELATIONSHIPS else []
+        return build_azure_snapshot(resources, sources=sources, edges=edges), True
+    except CliBusyError:
+        # Let the API answer 503 with Retry-After instead of caching a fallback
+        raise
     except subprocess.TimeoutExpired:
         print("Azure CLI command timed out", file=sys.stderr)
-        return create_azure_fallback_html()
     except Exception as e:
         print(f"Error generating Azure resource info: {e}", file=sys.stderr)
-        return create_azure_fallback_html()
+    metrics.inc('zt_fallbacks_total', provider='azure')
+    return InventorySnapshot([], html=create_azure_fallback_html()), False
+
+def build_azure_snapshot(resources, version=None, sources=None, edges=None):
+    """Build the snapshot for a resource list, rendering HTML up front in server mode"""
+    edges = edges or []
+    snapshot = InventorySnapshot(resources, layout_diagram(resources), version or inventory_version(resources, edges),
+                                 sources=sources, edges=edges, render=render_azure_snapshot_html)
+    if AZURE_RENDER_MODE == 'server':
+        snapshot.html  # render here, off the request path
+    return snapshot
+
+def render_azure_snapshot_html(snapshot):
+    """Render the Azure diagram and table of a snapshot, after any source errors"""
+    return (create_azure_source_errors_html(snapshot.sources)
+            + create_diagram_svg(snapshot.layout, edges=snapshot.edges)
+            + create_resources_html(snapshot.resources))
+
+def dump_snapshot(snapshot):
+    """Convert a snapshot to compact JSON-compatible data for sharing between processes"""
+    return {
+        'version': snapshot.version,
+        'sources': snapshot.sources,
+        'resources': [[r.id, r.name, r.type, r.resource_group, r.location] for r in snapshot.resources],
+        'edges': encode_edges(snapshot.resources, snapshot.edges),
+    }
+
+def load_azure_snapshot(data):
+    """Rebuild a snapshot from dump_snapshot() output"""
+    resources = [Resource(*row) for row in data['resources']]
+    edges = [(resources[source].id, resources[target].id, label) for source, target, label in data.get('edges', [])]
+    return build_azure_snapshot(resources, data['version'], data.get('sources'), edges)
+
+# Diagram geometry in SVG user units
+DIAGRAM_MARGIN = 40
+DIAGRAM_TOP = 60
+DIAGRAM_GROUP_WIDTH = 180
+DIAGRAM_GROUP_GAP = 30
+DIAGRAM_RESOURCE_PITCH = 80
+DIAGRAM_VIEWPORT_HEIGHT = 800
+
+@timed_stage('layout')
+def layout_diagram(resources, max_width=None, group_limit=None):
+    """Lay resource groups out on a masonry grid and compute the canvas size
+
+    Each group goes into the currently shortest column. Groups with more than
+    ``group_limit`` resources show the first ones plus a "+N more" summary row.
+    """
+    max_width = max_width or AZURE_DIAGRAM_MAX_WIDTH
+    group_limit = group_limit or AZURE_DIAGRAM_GROUP_LIMIT
 
-def create_azure_diagram_svg(resources_text):
-    """Create a responsive SVG diagram of Azure resources"""
-    lines = resources_text.strip().split('\n')
-    if len(lines) < 3:
-        return ""
-    
-    # Parse resources
-    resource_lines = lines[2:]  # Skip header and separator
-    resources = []
-    
-    for line in resource_lines:
-        if line.strip():
-            cells = [cell.strip() for cell in line.split('  ') if cell.strip()]
-            if len(cells) >= 4:  # Name, Type, ResourceGroup, Location
-                resources.append({
-                    'name': cells[0],
-                    'type': cells[1],
-                    'resourceGroup': cells[2],
-                    'location': cells[3]
-                })
-    
-    if not resources:
-        return ""
-    
-    # Group resources by resource group
     resource_groups = {}
     for resource in resources:
-        rg = resource['resourceGroup']
-        if rg not in resource_groups:
-            resource_groups[rg] = []
-        resource_groups[rg].append(resource)
-    
-    # Create responsive SVG with JavaScript
-    svg_id = f"azure-diagram-{hash(str(resources)) % 10000}"
-    
-    svg_html = f'''
-    <div style="margin: 20px 0; text-align: center;">
-        <div id="{svg_id}-container" style="width: 100%; height: 500px; border: 1px solid #ddd; background: #fafafa; overflow: auto; position: relative;">
-            <svg id="{svg_id}" style="display: block; min-width: 100%; min-height: 100%;" viewBox="0 0 1200 600" preserveAspectRatio="none">
-                <defs>
-                    <marker id="arrowhead" markerWidth="10" markerHeight="7" refX="9" refY="3.5" orient="auto">
-                        <polygon points="0 0, 10 3.5, 0 7" fill="#1976d2" />
-                    </marker>
-                </defs>
-                <text x="500" y="25" text-anchor="middle" font-family="Arial, sans-serif" font-size="16" font-weight="bold" fill="#333">Azure Resources Overview</text>
-    '''
-    
-    # Calculate layout
-    num_rgs = len(resource_groups)
-    if num_rgs == 0:
+        resource_groups.setdefault(resource.resource_group, []).append(resource)
+
+    slot = DIAGRAM_GROUP_WIDTH + DIAGRAM_GROUP_GAP
+    num_columns = max(1, min(len(resource_groups), (max_width - 2 * DIAGRAM_MARGIN + DIAGRAM_GROUP_GAP) // slot))
+    column_heights = [DIAGRAM_TOP] * num_columns
+
+    groups = []
+    for rg_name in sorted(resource_groups, key=str.lower):
+        members = resource_groups[rg_name]
+        shown = members if len(members) <= group_limit else members[:group_limit - 1]
+        hidden = len(members) - len(shown)
+        rows = len(shown) + (1 if hidden else 0)
+        height = max(120, rows * DIAGRAM_RESOURCE_PITCH + 40)
+
+        column = column_heights.index(min(column_heights))
+        x = DIAGRAM_MARGIN + column * slot
+        y = column_heights[column]
+        column_heights[column] = y + height + DIAGRAM_GROUP_GAP
+        groups.append((rg_name, x, y, height, shown, hidden))
+
+    return {
+        'width': max(max_width, 2 * DIAGRAM_MARGIN + num_columns * slot - DIAGRAM_GROUP_GAP),
+        'height': max(column_heights) - DIAGRAM_GROUP_GAP + DIAGRAM_MARGIN,
+        'groups': groups,
+    }
+
+def create_diagram_svg(layout, viewport=None, id_prefix='azure', title='Azure Resources Overview', virtualize=True,
+                       edges=None):
+    """Create a scrollable SVG diagram of cloud resources from a computed layout
+
+    Large layouts are virtualized: only the groups intersecting the initial
+    viewport are drawn and the page fetches the rest as the user scrolls.
+    Pages without that script pass ``virtualize=False``. ``edges`` are drawn
+    as arrows between the resources they connect.
+    """
+    if not layout or not layout['groups']:
         return ""
-    
-    # Draw resource groups
-    x_spacing = 800 // num_rgs if num_rgs > 0 else 400
-    y_start = 60
-    
-    for i, (rg_name, rg_resources) in enumerate(resource_groups.items()):
-        x = 100 + i * x_spacing
-        
-        # Resource group container (reduced by 25% from 240px to 180px)
-        container_height = max(120, len(rg_resources) * 80 + 40)
-        svg_html += f'<rect x="{x-90}" y="{y_start-20}" width="180" height="{container_height}" fill="#e3f2fd" stroke="#1976d2" stroke-width="2" rx="5"/>'
-        
-        # Resource group title (truncated if too long)
-        display_rg_name = truncate_text(rg_name, 30)
-        svg_html += f'<text x="{x}" y="{y_start-5}" text-anchor="middle" font-family="Arial, sans-serif" font-size="12" font-weight="bold" fill="#1976d2">{display_rg_name}</text>'
-        
+
+    virtualized = virtualize and viewport is None and len(layout['groups']) > AZURE_DIAGRAM_VIRTUALIZE_ABOVE
+    if virtualized:
+        viewport = (0, 0, layout['width'], DIAGRAM_VIEWPORT_HEIGHT)
+
+    if AZURE_COMPACT_OUTPUT:
+        opening = f'<div class="zt-diagram"><div id="{id_prefix}-diagram-container" class="zt-diagram-scroll"'
+    else:
+        opening = (f'<div style="margin: 20px 0; text-align: center;"><div id="{id_prefix}-diagram-container" '
+                   'style="width: 100%; height: 500px; border: 1px solid #ddd; background: #fafafa; overflow: auto; position: relative;"')
+    return ''.join([
+        opening,
+        ' data-virtualized="1">' if virtualized else '>',
+        render_diagram_svg(layout, viewport, id_prefix, title, edges),
+        '</div></div>',
+    ])
+
+# Diagram markup templates. The compact set styles elements through classes
+# declared once in the SVG's <style> and draws each icon as a <use> of a <symbol>.
+LEGACY_SVG_MARKUP = {
+    'open': '<svg id="{id}" style="display: block;" width="{width}" height="{height}" viewBox="0 0 {width} {height}">'
+            '<defs><marker id="arrowhead" markerWidth="10" markerHeight="7" refX="9" refY="3.5" orient="auto">'
+            '<polygon points="0 0, 10 3.5, 0 7" fill="#1976d2" /></marker></defs>'
+            '<text x="{cx}" y="25" text-anchor="middle" font-family="Arial, sans-serif" font-size="16" '
+            'font-weight="bold" fill="#333">{title}</text>',
+    'group': '<rect x="{x}" y="{y}" width="{width}" height="{height}" fill="#e3f2fd" stroke="#1976d2" stroke-width="2" rx="5"/>'
+             '<text x="{cx}" y="{ty}" text-anchor="middle" font-family="Arial, sans-serif" font-size="12" font-weight="bold" fill="#1976d2">'
+             '<title>{name}</title>{label}</text>',
+    'icon': '<circle cx="{x}" cy="{y}" r="12" fill="#1976d2"/>'
+            '<text x="{x}" y="{ty}" text-anchor="middle" font-family="Arial, sans-serif" font-size="10" fill="white">{icon}</text>',
+    'name': '<text x="{x}" y="{y}" font-family="Arial, sans-serif" font-size="10" fill="#333"><title>{name}</title>{label}</text>',
+    'kind': '<text x="{x}" y="{y}" font-family="Arial, sans-serif" font-size="8" fill="#666"><title>{name}</title>{label}</text>',
+    'more': '<text x="{x}" y="{y}" text-anchor="middle" font-family="Arial, sans-serif" font-size="11" font-style="italic" '
+            'fill="#1976d2">+{hidden} more</text>',
+    'edge': '<path d="{d}" fill="none" stroke="#1976d2" stroke-width="1.5" stroke-opacity="0.7" marker-end="url(#arrowhead)">'
+            '{tooltip}</path>',
+    'symbol': '',
+}
+
+COMPACT_SVG_STYLE = ('.zt-svg{display:block}.zt-svg text{font:10px Arial,sans-serif;fill:#333}'
+                     '.zt-svg .h{font-size:16px;font-weight:bold;text-anchor:middle}'
+                     '.zt-svg .rg{fill:#e3f2fd;stroke:#1976d2;stroke-width:2}'
+                     '.zt-svg .g{font-size:12px;font-weight:bold;text-anchor:middle;fill:#1976d2}'
+                     '.zt-svg .k{font-size:8px;fill:#666}.zt-svg .i{text-anchor:middle;fill:#fff}'
+                     '.zt-svg .m{font-size:11px;font-style:italic;text-anchor:middle;fill:#1976d2}'
+                     '.zt-svg .e{fill:none;stroke:#1976d2;stroke-width:1.5;stroke-opacity:.7;marker-end:url(#arrowhead)}')
+
+COMPACT_SVG_MARKUP = {
+    'open': '<svg id="{id}" class="zt-svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}">'
+            '<style>{style}</style>'
+            '<defs><marker id="arrowhead" markerWidth="10" markerHeight="7" refX="9" refY="3.5" orient="auto">'
+            '<polygon points="0 0,10 3.5,0 7" fill="#1976d2"/></marker>{symbols}</defs>'
+            '<text class="h" x="{cx}" y="25">{title}</text>',
+    'group': '<rect class="rg" x="{x}" y="{y}" width="{width}" height="{height}" rx="5"/>'
+             '<text class="g" x="{cx}" y="{ty}"><title>{name}</title>{label}</text>',
+    'icon': '<use href="#{symbol}" x="{x}" y="{y}"/>',
+    'name': '<text x="{x}" y="{y}"><title>{name}</title>{label}</text>',
+    'kind': '<text class="k" x="{x}" y="{y}"><title>{name}</title>{label}</text>',
+    'more': '<text class="m" x="{x}" y="{y}">+{hidden} more</text>',
+    'edge': '<path class="e" d="{d}">{tooltip}</path>',
+    'symbol': '<symbol id="{symbol}" overflow="visible"><circle r="12" fill="#1976d2"/><text class="i" y="5">{icon}</text></symbol>',
+}
+
+def svg_markup():
+    """Return the diagram markup templates selected by AZURE_COMPACT_OUTPUT"""
+    return COMPACT_SVG_MARKUP if AZURE_COMPACT_OUTPUT else LEGACY_SVG_MARKUP
+
+@timed_stage('svg_render')
+def render_diagram_svg(layout, viewport=None, id_prefix='azure', title='Azure Resources Overview', edges=None):
+    """Render the ``<svg>`` element, optionally limited to groups within ``(x, y, width, height)``"""
+    markup = svg_markup()
+    width, height = layout['width'], layout['height']
+    # Icon symbols in order of first use, so the client renders identical ids
+    symbols = {}
+    parts = []
+
+    if viewport is not None:
+        vx, vy, vw, vh = viewport
+    for rg_name, gx, gy, gheight, shown, hidden in layout['groups']:
+        if viewport is not None and (gx + DIAGRAM_GROUP_WIDTH < vx or gx > vx + vw or gy + gheight < vy or gy > vy + vh):
+            continue
+        cx = gx + DIAGRAM_GROUP_WIDTH // 2
+
+        # Resource group container and title (truncated if too long)
+        parts.append(markup['group'].format(x=gx, y=gy, width=DIAGRAM_GROUP_WIDTH, height=gheight, cx=cx, ty=gy + 15,
+                                            name=escape(rg_name), label=escape(truncate_text(rg_name, 30))))
+
         # Resources in this group
-        for j, resource in enumerate(rg_resources):
-            y = y_start + j * 80
-            
-            # Resource icon (adjusted for smaller box)
-            icon = get_azure_icon(resource['type'])
-            svg_html += f'<circle cx="{x-45}" cy="{y+10}" r="12" fill="#1976d2"/>'
-            svg_html += f'<text x="{x-45}" y="{y+15}" text-anchor="middle" font-family="Arial, sans-serif" font-size="10" fill="white">{icon}</text>'
-            
-            # Resource name (truncated) with hover tooltip
-            display_name = truncate_text(resource['name'], 20)
-            svg_html += f'<text x="{x-20}" y="{y+8}" font-family="Arial, sans-serif" font-size="10" fill="#333" title="{resource["name"]}">{display_name}</text>'
-            
-            # Resource type (truncated) with hover tooltip
-            resource_type = resource['type'].split('/')[-1]
-            display_type = truncate_text(resource_type, 20)
-            svg_html += f'<text x="{x-20}" y="{y+20}" font-family="Arial, sans-serif" font-size="8" fill="#666" title="{resource_type}">{display_type}</text>'
-            
-            # Add arrow to next resource (if not the last one)
-            if j < len(rg_resources) - 1:
-                arrow_y = y + 35
-                svg_html += f'<line x1="{x-45}" y1="{arrow_y}" x2="{x-45}" y2="{arrow_y + 20}" stroke="#1976d2" stroke-width="2" marker-end="url(#arrowhead)"/>'
-    
-    svg_html += '''
-            </svg>
-        </div>
-    </div>
-    
-    <script>
-        function resizeDiagram() {
-            const container = document.getElementById('{svg_id}-container');
-            const svg = document.getElementById('{svg_id}');
-            if (container && svg) {
-                // Calculate content dimensions based on number of resource groups
-                const numResourceGroups = {len(resource_groups)};
-                const contentWidth = Math.max(1200, numResourceGroups * 250);
-                const contentHeight = Math.max(600, 500);
-                
-                // Set SVG to actual content size to enable scrolling
-                svg.style.width = contentWidth + 'px';
-                svg.style.height = contentHeight + 'px';
-                svg.setAttribute('viewBox', `0 0 ${{contentWidth}} ${{contentHeight}}`);
-            }
-        }
-        
-        // Resize on window resize
-        window.addEventListener('resize', resizeDiagram);
-        
-        // Initial resize
-        setTimeout(resizeDiagram, 100);
-    </script>
-    '''
-    
-    return svg_html
+        for j, resource in enumerate(shown):
+            y = gy + 20 + j * DIAGRAM_RESOURCE_PITCH
+            resource_type = resource.type.split('/')[-1]
+            icon = get_resource_icon(resource.type)
+            symbol = symbols.get(icon)
+            if symbol is None:
+                symbol = symbols[icon] = f"{id_prefix}-icon-{len(symbols)}"
+            parts.append(markup['icon'].format(x=gx + 45, y=y + 10, ty=y + 15, icon=icon, symbol=symbol))
+            parts.append(markup['name'].format(x=gx + 70, y=y + 8, name=escape(resource.name),
+                                               label=escape(truncate_text(resource.name, 20))))
+            parts.append(markup['kind'].format(x=gx + 70, y=y + 20, name=escape(resource_type),
+                                               label=escape(truncate_text(resource_type, 20))))
+
+        if hidden:
+            y = gy + 20 + len(shown) * DIAGRAM_RESOURCE_PITCH
+            parts.append(markup['more'].format(x=cx, y=y + 15, hidden=hidden))
+
+    if edges:
+        parts.extend(render_diagram_edges(layout, edges, viewport, markup))
+    header = markup['open'].format(
+        id=f"{id_prefix}-diagram", width=width, height=height, cx=width // 2, title=escape(title), style=COMPACT_SVG_STYLE,
+        symbols=''.join(markup['symbol'].format(symbol=symbol, icon=icon) for icon, symbol in symbols.items()))
+    return header + ''.join(parts) + '</svg>'
+
+def render_diagram_edges(layout, edges, viewport=None, markup=None):
+    """Render relationship arrows between the icons of resources shown in the diagram
+
+    Each edge curves out to the left of both icons. Edges to resources hidden
+    behind "+N more" are skipped; with a viewport, only edges with an end
+    inside it are drawn.
+    """
+    positions = {}
+    for _, gx, gy, _, shown, _ in layout['groups']:
+        for j, resource in enumerate(shown):
+            positions[resource.id] = (gx + 45, gy + 30 + j * DIAGRAM_RESOURCE_PITCH)
+
+    if viewport is not None:
+        vx, vy, vw, vh = viewport
+
+        def visible(point):
+            return vx <= point[0] <= vx + vw and vy <= point[1] <= vy + vh
+
+    markup = markup or svg_markup()
+    parts = []
+    for source, target, label in edges:
+        start, end = positions.get(source), positions.get(target)
+        if start is None or end is None:
+            continue
+        if viewport is not None and not (visible(start) or visible(end)):
+            continue
+        (x1, y1), (x2, y2) = start, end
+        tooltip = f'<title>{escape(label)}</title>' if label else ''
+        parts.append(markup['edge'].format(d=f"M{x1 - 12} {y1} C{x1 - 40} {y1} {x2 - 40} {y2} {x2 - 12} {y2}", tooltip=tooltip))
+    return parts
 
 def truncate_text(text, max_length):
     """Truncate text to max_length and add ellipsis if needed"""
@@ -209,10 +2554,15 @@ def truncate_text(text, max_length):
         return text
     return text[:max_length-3] + "..."
 
-def get_azure_icon(resource_type):
-    """Get a simple icon character for Azure resource type"""
+def get_resource_icon(resource_type):
+    """Get a simple icon character for an Azure or AWS resource type"""
     type_lower = resource_type.lower()
-    
+    if type_lower.startswith('aws::'):
+        return get_aws_icon(type_lower)
+    return get_azure_icon(type_lower)
+
+def get_azure_icon(type_lower):
+    """Get a simple icon character for a lower-cased Azure resource type"""
     if 'virtualmachine' in type_lower or 'vm' in type_lower:
         return '🖥'
     elif 'storage' in type_lower:
@@ -234,48 +2584,68 @@ def get_azure_icon(resource_type):
     else:
         return '☁'
 
-def create_azure_resources_html(resources_text):
-    """Create HTML representation of Azure resources"""
-    lines = resources_text.strip().split('\n')
-    if len(lines) < 3:  # Header + separator + at least one resource
+def get_aws_icon(type_lower):
+    """Get a simple icon character for a lower-cased AWS CloudFormation resource type"""
+    if type_lower.endswith('::instance'):
+        return '🖥'
+    elif type_lower.endswith('::bucket'):
+        return '💾'
+    elif type_lower.endswith(('::vpc', '::subnet', '::hostedzone')):
+        return '🌐'
+    else:
+        return '☁'
+
+# Page rules for the classes used by the compact table and diagram wrapper
+INVENTORY_CSS = ('.zt-list{margin-top:20px}.zt-list h4{margin-bottom:10px;color:#333}.zt-scroll{overflow-x:auto}'
+                 '.zt-table{width:100%;border-collapse:collapse;font-family:monospace;font-size:12px}'
+                 '.zt-table thead tr{background:#e1e1e1}.zt-table th{padding:8px;border:1px solid #ccc;text-align:left}'
+                 '.zt-table td{padding:6px;border:1px solid #ccc}.zt-diagram{margin:20px 0;text-align:center}'
+                 '.zt-diagram-scroll{width:100%;height:500px;border:1px solid #ddd;background:#fafafa;overflow:auto;position:relative}')
+
+AZURE_TABLE_COLUMNS = [('Name', 'name'), ('Type', 'type'), ('ResourceGroup', 'resource_group'), ('Location', 'location')]
+AWS_TABLE_COLUMNS = [('Name', 'name'), ('Type', 'type'), ('VPC / Service', 'resource_group'), ('Region', 'location')]
+
+@timed_stage('table_render')
+def create_resources_html(resources, id_prefix='azure-resource', columns=AZURE_TABLE_COLUMNS):
+    """Create the resource table HTML; ``columns`` defaults to the Azure ones
+
+    ``id_prefix`` keeps element IDs unique when a paged table is shown next to
+    the full one, or when the AWS inventory is rendered on the same page.
+    """
+    if not resources:
         return create_azure_fallback_html()
+    if AZURE_COMPACT_OUTPUT:
+        return ''.join([
+            f'<div id="{id_prefix}-list" class="zt-list"><h4>Detailed Resource List</h4><div class="zt-scroll">',
+            f'<table id="{id_prefix}-table" class="zt-table"><thead><tr>',
+            ''.join(f'<th>{col}</th>' for col, _ in columns),
+            f'</tr></thead><tbody id="{id_prefix}-rows">',
+            ''.join(create_resource_row(resource, columns) for resource in resources),
+            '</tbody></table></div></div>',
+        ])
     
-    # Parse the table output
-    header_line = lines[0]
-    separator_line = lines[1]
-    resource_lines = lines[2:]
-    
-    # Extract column names from header
-    columns = [col.strip() for col in header_line.split('  ') if col.strip()]
-    
-    html = """
-    <div style="margin-top: 20px;">
+    html = f"""
+    <div id="{id_prefix}-list" style="margin-top: 20px;">
         <h4 style="margin-bottom: 10px; color: #333;">Detailed Resource List</h4>
         <div style="overflow-x: auto;">
-            <table style="width: 100%; border-collapse: collapse; font-family: monospace; font-size: 12px;">
+            <table id="{id_prefix}-table" style="width: 100%; border-collapse: collapse; font-family: monospace; font-size: 12px;">
                 <thead>
                     <tr style="background: #e1e1e1;">
     """
     
     # Add header
-    for col in columns:
+    for col, _ in columns:
         html += f'<th style="padding: 8px; border: 1px solid #ccc; text-align: left;">{col}</th>'
     
-    html += """
+    html += f"""
                     </tr>
                 </thead>
-                <tbody>
+                <tbody id="{id_prefix}-rows">
     """
     
     # Add resource rows
-    for line in resource_lines:
-        if line.strip():
-            cells = [cell.strip() for cell in line.split('  ') if cell.strip()]
-            if len(cells) >= len(columns):
-                html += '<tr>'
-                for cell in cells[:len(columns)]:
-                    html += f'<td style="padding: 6px; border: 1px solid #ccc;">{cell}</td>'
-                html += '</tr>'
+    for resource in resources:
+        html += create_resource_row(resource, columns)
     
     html += """
                 </tbody>
@@ -286,6 +2656,86 @@ def create_azure_resources_html(resources_text):
     
     return html
 
+def create_resource_row(resource, columns=AZURE_TABLE_COLUMNS):
+    """Create the table row for one resource, keyed by resource ID for in-place updates"""
+    cell = '<td>' if AZURE_COMPACT_OUTPUT else '<td style="padding: 6px; border: 1px solid #ccc;">'
+    cells = ''.join(f'{cell}{escape(getattr(resource, attr))}</td>' for _, attr in columns)
+    return f'<tr data-id="{escape(resource.id)}">{cells}</tr>'
+
+azure_version_history = VersionHistory(AZURE_VERSION_HISTORY)
+azure_fetch_group = SingleFlight()
+inventory_history = InventoryHistory(HISTORY_DB_PATH, HISTORY_CHECKPOINT_EVERY, HISTORY_RETENTION) if HISTORY_DB_PATH else None
+
+def record_inventory_history(provider, snapshot, restored):
+    """Submit a newly installed snapshot to the change history, if one is configured"""
+    # A restored snapshot was recorded when it was fetched; recording it again
+    # would date it at the restart, and from the gunicorn master before the fork
+    if inventory_history is not None and not restored:
+        inventory_history.submit(provider, snapshot)
+
+def record_azure_update(snapshot, restored):
+    """Remember a newly installed Azure snapshot for delta responses and the change history"""
+    azure_version_history.record(snapshot)
+    record_inventory_history('azure', snapshot, restored)
+
+def fetch_azure_inventory():
+    """Run generate_azure_diagram(), sharing one in-flight fetch among concurrent callers"""
+    return azure_fetch_group.do((tuple(azure_inventory_sources()), AZURE_RESOURCE_QUERY), generate_azure_diagram)
+
+azure_inventory_cache = InventoryCache(
+    'azure-inventory', fetch_azure_inventory, AZURE_CACHE_TTL, AZURE_CACHE_MAX_STALE,
+    store=SharedSnapshotStore(SHARED_SNAPSHOT_PATH, dump_snapshot, load_azure_snapshot) if SHARED_SNAPSHOT_PATH else None,
+    on_update=record_azure_update,
+    persist=PersistentSnapshotStore(os.path.join(SNAPSHOT_DIR, 'azure-inventory.json.gz'), dump_snapshot,
+                                    load_azure_snapshot, SNAPSHOT_MAX_AGE) if SNAPSHOT_DIR else None,
+    gate=azure_refresh_wait)
+
+def build_azure_update(snapshot, since):
+    """Build the versioned API body for a snapshot: a delta against ``since`` or the full HTML"""
+    body = {'version': snapshot.version}
+    delta = azure_version_history.delta(since, snapshot) if snapshot.version and since else None
+    if delta is None:
+        body['html'] = snapshot.html
+        return body
+    body['since'] = since
+    body['delta'] = {
+        'added': [r.to_dict() for r in delta['added']],
+        'removed': delta['removed'],
+        'changed': [r.to_dict() for r in delta['changed']],
+    }
+    body['rows'] = {r.id: create_resource_row(r) for r in delta['added'] + delta['changed']}
+    body['diagram'] = create_diagram_svg(snapshot.layout, edges=snapshot.edges)
+    return body
+
+def build_azure_stream_event(snapshot, since):
+    """Format an inventory update as a Server-Sent Events message
+
+    In client render mode pages fetch the columns themselves, so the event
+    only announces the new version and nothing is rendered on the server.
+    """
+    update = {'version': snapshot.version} if AZURE_RENDER_MODE == 'client' else build_azure_update(snapshot, since)
+    return f"event: inventory\ndata: {json.dumps(update)}\n\n"
+
+azure_broadcaster = InventoryBroadcaster(azure_inventory_cache, build_azure_stream_event,
+                                         AZURE_STREAM_CHECK_INTERVAL, AZURE_STREAM_MAX_PER_WORKER)
+
+def create_azure_source_errors_html(sources):
+    """Create a warning listing the subscriptions or resource groups that could not be listed"""
+    return create_source_errors_html([(f"{source['subscription']} / {source['resourceGroup']}", source['error'])
+                                      for source in sources if source['error']])
+
+def create_source_errors_html(failures):
+    """Create a warning listing ``(source, error)`` pairs for inventory sources that failed"""
+    if not failures:
+        return ""
+    items = ''.join(f"<li>{escape(label)}: {escape(truncate_text(error, 200))}</li>" for label, error in failures)
+    return f"""
+    <div style="margin: 10px 0; padding: 10px; border: 1px solid #f0c36d; background: #fff8e1; color: #8a6d3b; text-align: left; font-size: 12px;">
+        <strong>Some sources could not be listed; showing partial results.</strong>
+        <ul style="margin: 5px 0 0 0;">{items}</ul>
+    </div>
+    """
+
 def create_azure_fallback_html():
     """Create fallback HTML when Azure CLI fails"""
     return """
@@ -301,59 +2751,767 @@ def create_azure_fallback_html():
     </div>
     """
 
+class AwsClientPool:
+    """boto3 clients cached per service and region, all created from one session
+
+    Clients are thread-safe once created but sessions are not, so creation is
+    serialized. Each client keeps up to ``pool_size`` keep-alive connections.
+    """
+
+    def __init__(self, endpoint_url=None, pool_size=10, timeout=30):
+        self.endpoint_url = endpoint_url
+        self.config = BotoConfig(max_pool_connections=pool_size, connect_timeout=timeout, read_timeout=timeout,
+                                 retries={'max_attempts': 3, 'mode': 'standard'})
+        self._session = None
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def client(self, service, region):
+        """Return the shared client for a service in a region, creating it on first use"""
+        key = (service, region)
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    if self._session is None:
+                        self._session = boto3.session.Session()
+                    client = self._session.client(service, region_name=region, endpoint_url=self.endpoint_url,
+                                                  config=self.config)
+                    self._clients[key] = client
+        return client
+
+aws_client_pool = AwsClientPool(AWS_ENDPOINT_URL, AWS_POOL_SIZE, AWS_API_TIMEOUT) if boto3 is not None else None
+
+def aws_home_region():
+    """Return the region used for global services and region discovery"""
+    return AWS_DEFAULT_REGION if AWS_DEFAULT_REGION != 'Not set' else 'us-east-1'
+
+def aws_inventory_regions():
+    """Return the regions to scan, asking EC2 for the enabled ones when AWS_REGIONS is 'all'"""
+    if AWS_REGIONS != ['all']:
+        return AWS_REGIONS
+    response = aws_client_pool.client('ec2', aws_home_region()).describe_regions()
+    return sorted(region['RegionName'] for region in response['Regions'])
+
+def aws_tag_name(item):
+    """Return the value of an EC2 item's Name tag, if any"""
+    return next((tag['Value'] for tag in item.get('Tags') or [] if tag['Key'] == 'Name'), None)
+
+def list_aws_inventory():
+    """Scan every region, plus S3 and Route 53, concurrently and merge the results
+
+    Returns ``(resources, sources)`` where ``sources`` reports the resource count
+    or error for each region and global service. Raises only when every source failed.
+    """
+    if aws_client_pool is None:
+        raise RuntimeError("boto3 is not installed")
+    sources = [(region, list_aws_region, (region,)) for region in aws_inventory_regions()]
+    sources.append(('s3', list_aws_buckets, ()))
+    if AWS_ROUTE53_DOMAIN != 'Not set':
+        sources.append(('route53', list_aws_hosted_zones, ()))
+    with ThreadPoolExecutor(max_workers=max(1, min(AWS_FANOUT_WORKERS, len(sources))),
+                            thread_name_prefix='aws-fanout') as pool:
+        futures = [pool.submit(scan, *args) for _, scan, args in sources]
+
+    merged = {}
+    report = []
+    errors = []
+    for (name, _, _), future in zip(sources, futures):
+        entry = {'source': name, 'count': 0, 'error': None}
+        try:
+            resources = future.result()
+        except Exception as e:
+            print(f"Scanning AWS {name} failed: {e}", file=sys.stderr)
+            entry['error'] = str(e)
+            errors.append(e)
+        else:
+            entry['count'] = len(resources)
+            for resource in resources:
+                merged.setdefault(resource.id, resource)
+        report.append(entry)
+
+    if errors and len(errors) == len(sources):
+        raise errors[0]
+    return list(merged.values()), report
+
+def list_aws_region(region):
+    """Return the VPCs, subnets, instances and load balancers of one region, grouped by VPC"""
+    ec2 = aws_client_pool.client('ec2', region)
+    vpcs = {}
+    resources = []
+    for page in ec2.get_paginator('describe_vpcs').paginate():
+        for vpc in page['Vpcs']:
+            name = aws_tag_name(vpc)
+            vpcs[vpc['VpcId']] = f"{name} ({vpc['VpcId']})" if name else vpc['VpcId']
+            resources.append(Resource(f"arn:aws:ec2:{region}:{vpc['OwnerId']}:vpc/{vpc['VpcId']}", name or vpc['VpcId'],
+                                      'AWS::EC2::VPC', vpcs[vpc['VpcId']], region))
+    for page in ec2.get_paginator('describe_subnets').paginate():
+        for subnet in page['Subnets']:
+            resources.append(Resource(subnet['SubnetArn'], aws_tag_name(subnet) or subnet['SubnetId'], 'AWS::EC2::Subnet',
+                                      vpcs.get(subnet['VpcId'], subnet['VpcId']), region))
+    for page in ec2.get_paginator('describe_instances').paginate():
+        for reservation in page['Reservations']:
+            for instance in reservation['Instances']:
+                if instance['State']['Name'] == 'terminated':
+                    continue
+                vpc_id = instance.get('VpcId')
+                resources.append(Resource(f"arn:aws:ec2:{region}:{reservation['OwnerId']}:instance/{instance['InstanceId']}",
+                                          aws_tag_name(instance) or instance['InstanceId'], 'AWS::EC2::Instance',
+                                          vpcs.get(vpc_id, vpc_id) if vpc_id else region, region))
+    elbv2 = aws_client_pool.client('elbv2', region)
+    for page in elbv2.get_paginator('describe_load_balancers').paginate():
+        for balancer in page['LoadBalancers']:
+            vpc_id = balancer.get('VpcId')
+            resources.append(Resource(balancer['LoadBalancerArn'], balancer['LoadBalancerName'],
+                                      'AWS::ElasticLoadBalancingV2::LoadBalancer',
+                                      vpcs.get(vpc_id, vpc_id) if vpc_id else region, region))
+    return resources
+
+def list_aws_buckets():
+    """Return the account's S3 buckets; bucket listing is global"""
+    response = aws_client_pool.client('s3', aws_home_region()).list_buckets()
+    return [Resource(f"arn:aws:s3:::{bucket['Name']}", bucket['Name'], 'AWS::S3::Bucket', 'S3',
+                     bucket.get('BucketRegion') or 'global')
+            for bucket in response['Buckets']]
+
+def list_aws_hosted_zones():
+    """Return the Route 53 hosted zone for AWS_ROUTE53_DOMAIN, if it exists"""
+    domain = AWS_ROUTE53_DOMAIN.rstrip('.') + '.'
+    response = aws_client_pool.client('route53', 'us-east-1').list_hosted_zones_by_name(DNSName=domain, MaxItems='1')
+    return [Resource(f"arn:aws:route53:::hostedzone/{zone['Id'].split('/')[-1]}", zone['Name'].rstrip('.'),
+                     'AWS::Route53::HostedZone', 'Route 53', 'global')
+            for zone in response['HostedZones'] if zone['Name'] == domain]
+
+def generate_aws_inventory():
+    """Scan AWS and build the snapshot the AWS diagram and table render from
+
+    Returns an ``(InventorySnapshot, success)`` tuple like generate_azure_diagram().
+    """
+    try:
+        with tracked_fetch('aws'):
+            resources, sources = list_aws_inventory()
+        return build_aws_snapshot(resources, sources=sources), True
+    except Exception as e:
+        print(f"Error generating AWS resource info: {e}", file=sys.stderr)
+        metrics.inc('zt_fallbacks_total', provider='aws')
+        return InventorySnapshot([], html=create_aws_fallback_html()), False
+
+def build_aws_snapshot(resources, version=None, sources=None):
+    """Build the snapshot for an AWS resource list, rendering its HTML up front"""
+    snapshot = InventorySnapshot(resources, layout_diagram(resources), version or inventory_version(resources),
+                                 sources=sources, render=render_aws_snapshot_html)
+    snapshot.html
+    return snapshot
+
+def render_aws_snapshot_html(snapshot):
+    """Render the AWS diagram and table of a snapshot, after any source errors"""
+    errors = create_source_errors_html([(source['source'], source['error'])
+                                        for source in snapshot.sources if source['error']])
+    if not snapshot.resources:
+        return errors + '<div style="padding: 20px; text-align: center; color: #666;"><p>No AWS resources found</p></div>'
+    return (errors + create_diagram_svg(snapshot.layout, id_prefix='aws', title='AWS Resources Overview', virtualize=False)
+            + create_resources_html(snapshot.resources, id_prefix='aws-resource', columns=AWS_TABLE_COLUMNS))
+
+def load_aws_snapshot(data):
+    """Rebuild an AWS snapshot from dump_snapshot() output"""
+    return build_aws_snapshot([Resource(*row) for row in data['resources']], data['version'], data.get('sources'))
+
+def create_aws_fallback_html():
+    """Create fallback HTML when the AWS scan fails"""
+    return """
+    <div style="padding: 20px; text-align: center; color: #666;">
+        <p><strong>Unable to retrieve AWS resources</strong></p>
+        <p>This could be due to:</p>
+        <ul style="text-align: left; display: inline-block;">
+            <li>Missing or invalid AWS credentials</li>
+            <li>Insufficient IAM permissions</li>
+            <li>Network connectivity problems</li>
+            <li>boto3 not being installed</li>
+        </ul>
+    </div>
+    """
+
+aws_fetch_group = SingleFlight()
+
+def fetch_aws_inventory():
+    """Run generate_aws_inventory(), sharing one in-flight scan among concurrent callers"""
+    return aws_fetch_group.do((tuple(AWS_REGIONS), AWS_ROUTE53_DOMAIN), generate_aws_inventory)
+
+def record_aws_update(snapshot, restored):
+    """Remember a newly installed AWS snapshot in the change history"""
+    record_inventory_history('aws', snapshot, restored)
+
+aws_inventory_cache = InventoryCache(
+    'aws-inventory', fetch_aws_inventory, AWS_CACHE_TTL, AWS_CACHE_MAX_STALE,
+    on_update=record_aws_update,
+    store=SharedSnapshotStore(os.path.splitext(SHARED_SNAPSHOT_PATH)[0] + '-aws.json', dump_snapshot,
+                              load_aws_snapshot) if SHARED_SNAPSHOT_PATH else None,
+    persist=PersistentSnapshotStore(os.path.join(SNAPSHOT_DIR, 'aws-inventory.json.gz'), dump_snapshot,
+                                    load_aws_snapshot, SNAPSHOT_MAX_AGE) if SNAPSHOT_DIR else None)
+
+class BackgroundStartup:
+    """Startup work done off the request path: Azure login, then the first inventory fetches
+
+    Runs once per process, and again in each forked gunicorn worker, so the
+    server binds its port immediately. The login, and keeping it valid
+    afterwards, is left to the ``credentials`` manager; the Azure fetch waits
+    for its first attempt.
+    """
+
+    def __init__(self, credentials, caches):
+        self.credentials = credentials
+        self.caches = caches
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def start(self):
+        """Start the startup threads unless they already run in this process"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        if 'azure' in self.caches:
+            self.credentials.start()
+        for name, cache in self.caches.items():
+            threading.Thread(target=self._run, args=(cache, name == 'azure'), name=f"{name}-startup", daemon=True).start()
+
+    def _run(self, cache, after_login):
+        if after_login:
+            self.credentials.first_attempt.wait()
+        try:
+            # Fetches the first snapshot, or refreshes a restored one in the background
+            cache.get()
+        except Exception as e:
+            print(f"Initial {cache.name} fetch failed: {e}", file=sys.stderr)
+
+    def login_pending(self):
+        """Return True while the first Azure login has not finished yet"""
+        return 'azure' in self.caches and self.credentials.pending()
+
+    def readiness(self):
+        """Return ``(ready, checks)``: credentials usable and a good snapshot loaded for every provider"""
+        checks = {}
+        if 'azure' in self.caches:
+            auth = self.credentials.describe()
+            checks['azure_login'] = {'ok': auth['valid'], 'state': auth['state'], 'expires_in': auth['expires_in']}
+        for name, cache in self.caches.items():
+            entry = cache.peek()
+            state = 'loading' if entry is None else ('loaded' if entry['success'] else 'failed')
+            checks[f"{name}_inventory"] = {'ok': state == 'loaded', 'state': state}
+        return all(check['ok'] for check in checks.values()), checks
+
+# A recovered login refreshes the inventory right away instead of serving the
+# fallback left by the failure until the next request notices it
+azure_credentials = CredentialManager(
+    CLOUD_PROVIDER in ('azure', 'aws_and_azure') and AZURE_CLIENT_ID != 'Not set',
+    AZURE_CREDENTIAL_REFRESH_MARGIN, AZURE_LOGIN_BACKOFF_MIN, AZURE_LOGIN_BACKOFF_MAX,
+    on_recovered=azure_inventory_cache.refresh_in_background)
+
+background_startup = BackgroundStartup(
+    azure_credentials,
+    {name: cache for name, cache in (('azure', azure_inventory_cache), ('aws', aws_inventory_cache))
+     if CLOUD_PROVIDER in (name, 'aws_and_azure')})
+
+def create_azure_warming_up_html():
+    """Create placeholder HTML shown while the Azure login is still in progress"""
+    return """
+    <div style="padding: 20px; text-align: center; color: #666;">
+        <p><strong>Warming up</strong></p>
+        <p>Signing in to Azure; resources will appear shortly.</p>
+    </div>
+    """
+
+def get_azure_render_config():
+    """Return the settings the page needs to render the inventory in the browser"""
+    return json.dumps({
+        'mode': AZURE_RENDER_MODE,
+        'maxWidth': AZURE_DIAGRAM_MAX_WIDTH,
+        'groupLimit': AZURE_DIAGRAM_GROUP_LIMIT,
+        'margin': DIAGRAM_MARGIN,
+        'top': DIAGRAM_TOP,
+        'groupWidth': DIAGRAM_GROUP_WIDTH,
+        'groupGap': DIAGRAM_GROUP_GAP,
+        'pitch': DIAGRAM_RESOURCE_PITCH,
+        'compact': AZURE_COMPACT_OUTPUT,
+        'svgStyle': COMPACT_SVG_STYLE,
+        'pollInterval': AZURE_STREAM_FALLBACK_POLL,
+    })
+
 def get_azure_diagram_html():
     """Generate HTML for Azure resources with loading state"""
-    return """
+    return f"<script>const azureRenderConfig = {get_azure_render_config()};</script>" + """
     <div id="azure-resources-container" style="margin: 20px 0; padding: 20px; border: 1px solid #ddd; border-radius: 5px; background: #f9f9f9;">
         <div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 15px;">
             <h3 style="margin: 0; color: #333;">Azure Resources Overview</h3>
-            <button id="refresh-azure-btn" onclick="refreshAzureResources()" 
+            <button id="refresh-azure-btn" onclick="refreshAzureResources(true)" 
                     style="padding: 8px 16px; background: #0078d4; color: white; border: none; border-radius: 4px; cursor: pointer; font-size: 12px;">
                 🔄 Refresh
             </button>
         </div>
         <div id="azure-loading" style="text-align: center; padding: 40px; color: #666;">
             <div style="font-size: 18px; margin-bottom: 10px;">⏳</div>
-            <p>Loading Azure resources...</p>
+            <p id="azure-loading-text">Loading Azure resources...</p>
+        </div>
+        <div id="azure-filters" style="display: none; gap: 8px; flex-wrap: wrap; margin-bottom: 10px; font-size: 12px;">
+            <input id="azure-filter-prefix" type="search" placeholder="Name starts with..." oninput="scheduleAzureQuery()" style="padding: 4px;">
+            <select id="azure-filter-group" onchange="runAzureQuery(0)"><option value="">All resource groups</option></select>
+            <select id="azure-filter-type" onchange="runAzureQuery(0)"><option value="">All types</option></select>
+            <select id="azure-filter-location" onchange="runAzureQuery(0)"><option value="">All locations</option></select>
+            <select id="azure-sort" onchange="runAzureQuery(0)">
+                <option value="name">Sort by name</option>
+                <option value="type">Sort by type</option>
+                <option value="group">Sort by resource group</option>
+                <option value="location">Sort by location</option>
+            </select>
         </div>
         <div id="azure-content" style="display: none;"></div>
+        <div id="azure-query-results" style="display: none;"></div>
+        <div id="azure-cache-status" style="margin-top: 10px; font-size: 11px; color: #888; text-align: right;"></div>
     </div>
     <script>
-        // Load Azure resources on page load
+        // Load Azure resources on page load, then follow server-pushed updates
         document.addEventListener('DOMContentLoaded', function() {
             refreshAzureResources();
+            subscribeAzureUpdates();
         });
         
-        function refreshAzureResources() {
+        function subscribeAzureUpdates() {
+            if (!window.EventSource) {
+                return;
+            }
+            const source = new EventSource('api/azure-resources/stream');
+            source.onerror = function() {
+                // A refused stream (the server is at its stream limit) is not retried
+                // by the browser: poll for a while, then try to subscribe again
+                if (source.readyState === EventSource.CLOSED) {
+                    setTimeout(function() {
+                        refreshAzureResources();
+                        subscribeAzureUpdates();
+                    }, azureRenderConfig.pollInterval * 1000);
+                }
+            };
+            source.addEventListener('inventory', function(event) {
+                const data = JSON.parse(event.data);
+                if (data.version === azureVersion) {
+                    return;
+                }
+                if (data.delta && data.since === azureVersion && azureRenderConfig.mode !== 'client') {
+                    applyAzureDelta(data);
+                    azureVersion = data.version;
+                    setupDiagramVirtualization();
+                    loadAzureFacets();
+                    document.getElementById('azure-cache-status').textContent = 'Updated just now (live)';
+                } else {
+                    // The push was computed against another version; fetch our own delta
+                    refreshAzureResources();
+                }
+            });
+        }
+        
+        // Version of the inventory currently shown, used for conditional and delta requests
+        let azureVersion = null;
+        
+        function refreshAzureResources(force) {
             const loadingDiv = document.getElementById('azure-loading');
             const contentDiv = document.getElementById('azure-content');
             const refreshBtn = document.getElementById('refresh-azure-btn');
+            const statusDiv = document.getElementById('azure-cache-status');
             
             // Show loading state
+            document.getElementById('azure-loading-text').textContent = 'Loading Azure resources...';
             loadingDiv.style.display = 'block';
             contentDiv.style.display = 'none';
             refreshBtn.disabled = true;
             refreshBtn.innerHTML = '⏳ Loading...';
             
-            // Fetch Azure resources
-            fetch('api/azure-resources')
-                .then(response => response.json())
+            // Fetch Azure resources, asking only for changes when a version is already shown
+            const params = new URLSearchParams();
+            const headers = {};
+            if (force) {
+                params.set('refresh', '1');
+            }
+            if (azureRenderConfig.mode === 'client') {
+                params.set('format', 'columns');
+            }
+            if (azureVersion) {
+                if (azureRenderConfig.mode !== 'client') {
+                    params.set('since', azureVersion);
+                }
+                headers['If-None-Match'] = '"' + azureVersion + '"';
+            }
+            fetch('api/azure-resources?' + params.toString(), {headers: headers})
+                .then(response => response.status === 304 ? null : response.json())
                 .then(data => {
-                    if (data.success) {
-                        contentDiv.innerHTML = data.html;
-                        contentDiv.style.display = 'block';
-                        loadingDiv.style.display = 'none';
+                    if (data && data.warming_up) {
+                        // The server is still signing in; keep the loading state and retry
+                        document.getElementById('azure-loading-text').textContent = data.message;
+                        setTimeout(() => refreshAzureResources(force), data.retry_after * 1000);
+                        return;
+                    }
+                    if (data === null) {
+                        statusDiv.textContent = 'Up to date';
                     } else {
-                        contentDiv.innerHTML = data.html;
-                        contentDiv.style.display = 'block';
-                        loadingDiv.style.display = 'none';
+                        if (data.cache) {
+                            statusDiv.textContent = 'Updated ' + Math.round(data.cache.age) + 's ago' +
+                                (data.cache.fresh ? '' : ' (stale, refreshing in background)');
+                        }
+                        if (data.auth && !data.auth.valid && data.auth.state === 'failed') {
+                            statusDiv.textContent += ' · Azure sign-in failing, retrying in ' + data.auth.next_refresh_in + 's';
+                        }
+                        if (data.throttling && data.throttling.deferred) {
+                            statusDiv.textContent += ' · Refresh held back to stay within Azure API limits, next in ' + data.throttling.retry_after + 's';
+                        }
+                        if (data.columns) {
+                            contentDiv.innerHTML = renderAzureDiagram(data) + renderAzureTable(data);
+                        } else if (data.delta) {
+                            applyAzureDelta(data);
+                        } else {
+                            contentDiv.innerHTML = data.html;
+                        }
+                        azureVersion = data.success ? data.version : null;
+                        setupDiagramVirtualization();
+                        loadAzureFacets();
                     }
+                    contentDiv.style.display = 'block';
+                    loadingDiv.style.display = 'none';
                 })
                 .catch(error => {
                     console.error('Error fetching Azure resources:', error);
                     contentDiv.innerHTML = '<div style="padding: 20px; text-align: center; color: red;"><p>Error loading Azure resources. Please try again.</p></div>';
                     contentDiv.style.display = 'block';
                     loadingDiv.style.display = 'none';
+                    azureVersion = null;
+                })
+                .finally(() => {
+                    refreshBtn.disabled = false;
+                    refreshBtn.innerHTML = '🔄 Refresh';
+                });
+        }
+        
+        // Patch the table rows and swap the diagram in place from a delta response
+        function applyAzureDelta(data) {
+            const tbody = document.getElementById('azure-resource-rows');
+            const findRow = id => Array.from(tbody.rows).find(row => row.dataset.id === id);
+            data.delta.removed.forEach(id => {
+                const row = findRow(id);
+                if (row) {
+                    row.remove();
+                }
+            });
+            data.delta.changed.concat(data.delta.added).forEach(resource => {
+                const row = findRow(resource.id);
+                if (row) {
+                    row.outerHTML = data.rows[resource.id];
+                } else {
+                    tbody.insertAdjacentHTML('beforeend', data.rows[resource.id]);
+                }
+            });
+            const diagram = document.getElementById('azure-diagram-container');
+            if (diagram) {
+                diagram.parentElement.outerHTML = data.diagram;
+            }
+        }
+        
+        // Filtered, sorted and paged views are answered by the server from its indexes
+        let azureQueryTimer = null;
+        
+        function scheduleAzureQuery() {
+            clearTimeout(azureQueryTimer);
+            azureQueryTimer = setTimeout(() => runAzureQuery(0), 250);
+        }
+        
+        function azureQueryParams() {
+            const params = new URLSearchParams();
+            [['prefix', 'azure-filter-prefix'], ['group', 'azure-filter-group'], ['type', 'azure-filter-type'], ['location', 'azure-filter-location']].forEach(([param, id]) => {
+                const value = document.getElementById(id).value;
+                if (value) {
+                    params.set(param, value);
+                }
+            });
+            const sort = document.getElementById('azure-sort').value;
+            if (sort !== 'name') {
+                params.set('sort', sort);
+            }
+            return params;
+        }
+        
+        function runAzureQuery(offset) {
+            const params = azureQueryParams();
+            const resultsDiv = document.getElementById('azure-query-results');
+            const fullList = document.getElementById('azure-resource-list');
+            if (params.toString() === '' && offset === 0) {
+                // No filters: show the complete table again
+                resultsDiv.style.display = 'none';
+                if (fullList) {
+                    fullList.style.display = 'block';
+                }
+                return;
+            }
+            params.set('offset', offset);
+            fetch('api/azure-resources?' + params.toString())
+                .then(response => response.json())
+                .then(data => {
+                    if (!data.success) {
+                        return;
+                    }
+                    const q = data.query;
+                    const last = Math.min(q.offset + q.limit, q.total);
+                    let pager = '<div style="margin-top: 8px; font-size: 12px;">' + (q.total ? (q.offset + 1) + '–' + last : 0) + ' of ' + q.total + ' ';
+                    if (q.offset > 0) {
+                        pager += '<button onclick="runAzureQuery(' + Math.max(0, q.offset - q.limit) + ')">◀ Previous</button> ';
+                    }
+                    if (q.next_cursor) {
+                        pager += '<button onclick="runAzureQuery(' + last + ')">Next ▶</button>';
+                    }
+                    resultsDiv.innerHTML = data.html + pager + '</div>';
+                    resultsDiv.style.display = 'block';
+                    if (fullList) {
+                        fullList.style.display = 'none';
+                    }
+                })
+                .catch(error => console.error('Error querying Azure resources:', error));
+        }
+        
+        function loadAzureFacets() {
+            fetch('api/azure-resources?limit=0&facets=1')
+                .then(response => response.json())
+                .then(data => {
+                    if (!data.success) {
+                        return;
+                    }
+                    [['group', 'azure-filter-group'], ['type', 'azure-filter-type'], ['location', 'azure-filter-location']].forEach(([param, id]) => {
+                        const select = document.getElementById(id);
+                        const selected = select.value;
+                        while (select.options.length > 1) {
+                            select.remove(1);
+                        }
+                        data.facets[param].forEach(value => select.add(new Option(value, value, false, value === selected)));
+                    });
+                    document.getElementById('azure-filters').style.display = 'flex';
+                    runAzureQuery(0);
+                })
+                .catch(error => console.error('Error loading Azure filters:', error));
+        }
+        
+        function escapeHtml(text) {
+            return String(text).replace(/[&<>"']/g, c => ({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'}[c]));
+        }
+        
+        function truncateText(text, maxLength) {
+            return text.length <= maxLength ? text : text.substring(0, maxLength - 3) + '...';
+        }
+        
+        // Client-side rendering of the columnar payload (AZURE_RENDER_MODE=client)
+        function renderAzureTable(data) {
+            const cols = data.columns, dicts = data.dictionaries;
+            if (data.count === 0) {
+                return '<div style="padding: 20px; text-align: center; color: #666;"><p><strong>No Azure resources found</strong></p></div>';
+            }
+            let td, th, parts;
+            if (azureRenderConfig.compact) {
+                td = '<td>';
+                th = '<th>';
+                parts = ['<div id="azure-resource-list" class="zt-list"><h4>Detailed Resource List</h4><div class="zt-scroll">',
+                    '<table id="azure-resource-table" class="zt-table"><thead><tr>'];
+            } else {
+                td = '<td style="padding: 6px; border: 1px solid #ccc;">';
+                th = '<th style="padding: 8px; border: 1px solid #ccc; text-align: left;">';
+                parts = ['<div id="azure-resource-list" style="margin-top: 20px;"><h4 style="margin-bottom: 10px; color: #333;">Detailed Resource List</h4>',
+                    '<div style="overflow-x: auto;"><table id="azure-resource-table" style="width: 100%; border-collapse: collapse; font-family: monospace; font-size: 12px;">',
+                    '<thead><tr style="background: #e1e1e1;">'];
+            }
+            parts.push(th, 'Name</th>', th, 'Type</th>', th, 'ResourceGroup</th>', th, 'Location</th></tr></thead><tbody>');
+            for (let i = 0; i < data.count; i++) {
+                parts.push('<tr>', td, escapeHtml(cols.name[i]), '</td>', td, escapeHtml(dicts.type[cols.type[i]]), '</td>',
+                    td, escapeHtml(dicts.resourceGroup[cols.resourceGroup[i]]), '</td>', td, escapeHtml(dicts.location[cols.location[i]]), '</td></tr>');
+            }
+            parts.push('</tbody></table></div></div>');
+            return parts.join('');
+        }
+        
+        // Same masonry layout as layout_diagram() on the server
+        function renderAzureDiagram(data) {
+            const cfg = azureRenderConfig, cols = data.columns, dicts = data.dictionaries;
+            if (data.count === 0) {
+                return '';
+            }
+            const groups = new Map();
+            for (let i = 0; i < data.count; i++) {
+                const rg = dicts.resourceGroup[cols.resourceGroup[i]];
+                if (!groups.has(rg)) {
+                    groups.set(rg, []);
+                }
+                groups.get(rg).push(i);
+            }
+            const names = Array.from(groups.keys()).sort((a, b) => a.toLowerCase() < b.toLowerCase() ? -1 : a.toLowerCase() > b.toLowerCase() ? 1 : 0);
+            const slot = cfg.groupWidth + cfg.groupGap;
+            const numColumns = Math.max(1, Math.min(names.length, Math.floor((cfg.maxWidth - 2 * cfg.margin + cfg.groupGap) / slot)));
+            const heights = new Array(numColumns).fill(cfg.top);
+            const text = 'font-family="Arial, sans-serif"';
+            const compact = cfg.compact;
+            // Icon symbols in order of first use, as render_diagram_svg() numbers them
+            const body = [], positions = new Map(), symbols = new Map();
+            names.forEach(rg => {
+                const members = groups.get(rg);
+                const shown = members.length <= cfg.groupLimit ? members : members.slice(0, cfg.groupLimit - 1);
+                const hidden = members.length - shown.length;
+                const height = Math.max(120, (shown.length + (hidden ? 1 : 0)) * cfg.pitch + 40);
+                const column = heights.indexOf(Math.min.apply(null, heights));
+                const gx = cfg.margin + column * slot, gy = heights[column];
+                heights[column] = gy + height + cfg.groupGap;
+                const rgTitle = `<title>${escapeHtml(rg)}</title>${escapeHtml(truncateText(rg, 30))}</text>`;
+                body.push(compact
+                    ? `<rect class="rg" x="${gx}" y="${gy}" width="${cfg.groupWidth}" height="${height}" rx="5"/><text class="g" x="${gx + cfg.groupWidth / 2}" y="${gy + 15}">` + rgTitle
+                    : `<rect x="${gx}" y="${gy}" width="${cfg.groupWidth}" height="${height}" fill="#e3f2fd" stroke="#1976d2" stroke-width="2" rx="5"/>` +
+                      `<text x="${gx + cfg.groupWidth / 2}" y="${gy + 15}" text-anchor="middle" ${text} font-size="12" font-weight="bold" fill="#1976d2">` + rgTitle);
+                shown.forEach((i, j) => {
+                    const y = gy + 20 + j * cfg.pitch;
+                    positions.set(i, [gx + 45, y + 10]);
+                    const name = cols.name[i], type = dicts.type[cols.type[i]].split('/').pop(), icon = data.icons[cols.type[i]];
+                    const nameTitle = `<title>${escapeHtml(name)}</title>${escapeHtml(truncateText(name, 20))}</text>`;
+                    const typeTitle = `<title>${escapeHtml(type)}</title>${escapeHtml(truncateText(type, 20))}</text>`;
+                    if (compact) {
+                        if (!symbols.has(icon)) {
+                            symbols.set(icon, 'azure-icon-' + symbols.size);
+                        }
+                        body.push(`<use href="#${symbols.get(icon)}" x="${gx + 45}" y="${y + 10}"/>`,
+                            `<text x="${gx + 70}" y="${y + 8}">` + nameTitle, `<text class="k" x="${gx + 70}" y="${y + 20}">` + typeTitle);
+                    } else {
+                        body.push(`<circle cx="${gx + 45}" cy="${y + 10}" r="12" fill="#1976d2"/>`,
+                            `<text x="${gx + 45}" y="${y + 15}" text-anchor="middle" ${text} font-size="10" fill="white">${icon}</text>`,
+                            `<text x="${gx + 70}" y="${y + 8}" ${text} font-size="10" fill="#333">` + nameTitle,
+                            `<text x="${gx + 70}" y="${y + 20}" ${text} font-size="8" fill="#666">` + typeTitle);
+                    }
+                });
+                if (hidden) {
+                    const y = gy + 20 + shown.length * cfg.pitch;
+                    body.push(compact
+                        ? `<text class="m" x="${gx + cfg.groupWidth / 2}" y="${y + 15}">+${hidden} more</text>`
+                        : `<text x="${gx + cfg.groupWidth / 2}" y="${y + 15}" text-anchor="middle" ${text} font-size="11" font-style="italic" fill="#1976d2">+${hidden} more</text>`);
+                }
+            });
+            // Relationship arrows, as render_diagram_edges() draws them
+            (data.edges || []).forEach(([source, target, label]) => {
+                const start = positions.get(source), end = positions.get(target);
+                if (start && end) {
+                    const [x1, y1] = start, [x2, y2] = end;
+                    const d = `M${x1 - 12} ${y1} C${x1 - 40} ${y1} ${x2 - 40} ${y2} ${x2 - 12} ${y2}`;
+                    const tooltip = label ? `<title>${escapeHtml(label)}</title>` : '';
+                    body.push(compact
+                        ? `<path class="e" d="${d}">${tooltip}</path>`
+                        : `<path d="${d}" fill="none" stroke="#1976d2" stroke-width="1.5" stroke-opacity="0.7" marker-end="url(#arrowhead)">${tooltip}</path>`);
+                }
+            });
+            const width = Math.max(cfg.maxWidth, 2 * cfg.margin + numColumns * slot - cfg.groupGap);
+            const height = Math.max.apply(null, heights) - cfg.groupGap + cfg.margin;
+            if (compact) {
+                const defs = Array.from(symbols, ([icon, id]) => `<symbol id="${id}" overflow="visible"><circle r="12" fill="#1976d2"/><text class="i" y="5">${icon}</text></symbol>`);
+                return '<div class="zt-diagram"><div id="azure-diagram-container" class="zt-diagram-scroll">' +
+                    `<svg id="azure-diagram" class="zt-svg" width="${width}" height="${height}" viewBox="0 0 ${width} ${height}"><style>${cfg.svgStyle}</style>` +
+                    '<defs><marker id="arrowhead" markerWidth="10" markerHeight="7" refX="9" refY="3.5" orient="auto"><polygon points="0 0,10 3.5,0 7" fill="#1976d2"/></marker>' +
+                    defs.join('') + `</defs><text class="h" x="${Math.floor(width / 2)}" y="25">Azure Resources Overview</text>` +
+                    body.join('') + '</svg></div></div>';
+            }
+            return '<div style="margin: 20px 0; text-align: center;"><div id="azure-diagram-container" style="width: 100%; height: 500px; border: 1px solid #ddd; background: #fafafa; overflow: auto; position: relative;">' +
+                `<svg id="azure-diagram" style="display: block;" width="${width}" height="${height}" viewBox="0 0 ${width} ${height}">` +
+                '<defs><marker id="arrowhead" markerWidth="10" markerHeight="7" refX="9" refY="3.5" orient="auto"><polygon points="0 0, 10 3.5, 0 7" fill="#1976d2" /></marker></defs>' +
+                `<text x="${Math.floor(width / 2)}" y="25" text-anchor="middle" ${text} font-size="16" font-weight="bold" fill="#333">Azure Resources Overview</text>` +
+                body.join('') + '</svg></div></div>';
+        }
+        
+        // Large diagrams only ship the first viewport; fetch the visible region on scroll
+        function setupDiagramVirtualization() {
+            const container = document.getElementById('azure-diagram-container');
+            if (!container || !container.dataset.virtualized) {
+                return;
+            }
+            let timer = null;
+            container.addEventListener('scroll', function() {
+                clearTimeout(timer);
+                timer = setTimeout(function() {
+                    // Overscan by one viewport in each direction
+                    const w = container.clientWidth, h = container.clientHeight;
+                    const viewport = [container.scrollLeft - w, container.scrollTop - h, 3 * w, 3 * h].map(Math.round).join(',');
+                    fetch('api/azure-diagram?viewport=' + viewport)
+                        .then(response => response.json())
+                        .then(data => {
+                            if (data.success) {
+                                document.getElementById('azure-diagram').outerHTML = data.svg;
+                            }
+                        })
+                        .catch(error => console.error('Error fetching diagram viewport:', error));
+                }, 150);
+            });
+        }
+    </script>
+    """
+
+def get_aws_inventory_html():
+    """Generate HTML for AWS resources with loading state"""
+    return """
+    <div id="aws-resources-container" style="margin: 20px 0; padding: 20px; border: 1px solid #ddd; border-radius: 5px; background: #f9f9f9;">
+        <div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 15px;">
+            <h3 style="margin: 0; color: #333;">AWS Resources Overview</h3>
+            <button id="refresh-aws-btn" onclick="refreshAwsResources(true)" 
+                    style="padding: 8px 16px; background: #ff9900; color: white; border: none; border-radius: 4px; cursor: pointer; font-size: 12px;">
+                🔄 Refresh
+            </button>
+        </div>
+        <div id="aws-loading" style="text-align: center; padding: 40px; color: #666;">
+            <div style="font-size: 18px; margin-bottom: 10px;">⏳</div>
+            <p>Loading AWS resources...</p>
+        </div>
+        <div id="aws-content" style="display: none;"></div>
+        <div id="aws-cache-status" style="margin-top: 10px; font-size: 11px; color: #888; text-align: right;"></div>
+    </div>
+    <script>
+        document.addEventListener('DOMContentLoaded', function() {
+            refreshAwsResources();
+        });
+        
+        // Version of the AWS inventory currently shown, used for conditional requests
+        let awsVersion = null;
+        
+        function refreshAwsResources(force) {
+            const loadingDiv = document.getElementById('aws-loading');
+            const contentDiv = document.getElementById('aws-content');
+            const refreshBtn = document.getElementById('refresh-aws-btn');
+            const statusDiv = document.getElementById('aws-cache-status');
+            
+            loadingDiv.style.display = 'block';
+            contentDiv.style.display = 'none';
+            refreshBtn.disabled = true;
+            refreshBtn.innerHTML = '⏳ Loading...';
+            
+            const headers = {};
+            if (awsVersion) {
+                headers['If-None-Match'] = '"' + awsVersion + '"';
+            }
+            fetch('api/aws-resources' + (force ? '?refresh=1' : ''), {headers: headers})
+                .then(response => response.status === 304 ? null : response.json())
+                .then(data => {
+                    if (data === null) {
+                        statusDiv.textContent = 'Up to date';
+                    } else {
+                        if (data.cache) {
+                            statusDiv.textContent = 'Updated ' + Math.round(data.cache.age) + 's ago' +
+                                (data.cache.fresh ? '' : ' (stale, refreshing in background)');
+                        }
+                        contentDiv.innerHTML = data.html;
+                        awsVersion = data.success ? data.version : null;
+                    }
+                    contentDiv.style.display = 'block';
+                    loadingDiv.style.display = 'none';
+                })
+                .catch(error => {
+                    console.error('Error fetching AWS resources:', error);
+                    contentDiv.innerHTML = '<div style="padding: 20px; text-align: center; color: red;"><p>Error loading AWS resources. Please try again.</p></div>';
+                    contentDiv.style.display = 'block';
+                    loadingDiv.style.display = 'none';
+                    awsVersion = null;
                 })
                 .finally(() => {
                     refreshBtn.disabled = false;
@@ -363,6 +3521,93 @@ def get_azure_diagram_html():
     </script>
     """
 
+class StaticBody:
+    """Immutable response body kept in memory with precompressed variants
+
+    Each encoding gets its own strong ETag so caches never mix representations.
+    """
+
+    __slots__ = ('mimetype', 'etag', 'variants')
+
+    def __init__(self, data, mimetype):
+        self.mimetype = mimetype
+        self.etag = hashlib.sha256(data).hexdigest()[:32]
+        self.variants = {'identity': data}
+        compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        if len(compressed) < len(data):
+            self.variants['gzip'] = compressed
+        if brotli is not None:
+            compressed = brotli.compress(data, quality=11)
+            if len(compressed) < len(data):
+                self.variants['br'] = compressed
+
+def negotiate_encoding(available):
+    """Pick the preferred Content-Encoding among ``available`` that the client accepts"""
+    for encoding in ('br', 'gzip'):
+        if encoding in available and request.accept_encodings[encoding]:
+            return encoding
+    return 'identity'
+
+def serve_static_body(body, cache_control):
+    """Serve a StaticBody, answering matching conditional requests with 304"""
+    encoding = negotiate_encoding(body.variants)
+    etag = body.etag if encoding == 'identity' else f"{body.etag}-{encoding}"
+
+    response = Response(mimetype=body.mimetype)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    response.vary.add('Accept-Encoding')
+    if request.if_none_match.contains(etag):
+        response.status_code = 304
+        return response
+
+    response.set_data(body.variants[encoding])
+    if encoding != 'identity':
+        response.content_encoding = encoding
+    return response
+
+def load_static_assets(names):
+    """Load assets into memory, keyed by name and by their content-hashed name"""
+    assets = {}
+    for name in names:
+        try:
+            with open(os.path.join(BASE_DIR, name), 'rb') as f:
+                data = f.read()
+        except OSError as e:
+            print(f"Unable to load static asset {name}: {e}", file=sys.stderr)
+            continue
+        body = StaticBody(data, mimetypes.guess_type(name)[0] or 'application/octet-stream')
+        stem, ext = os.path.splitext(name)
+        asset = {'name': name, 'hashed_name': f"{stem}.{body.etag[:12]}{ext}", 'body': body, 'size': len(data)}
+        assets[name] = asset
+        assets[asset['hashed_name']] = asset
+    return assets
+
+static_assets = load_static_assets(STATIC_ASSETS)
+
+def asset_url(name):
+    """Return the page URL for an asset: an inline data URI or its content-hashed path"""
+    asset = static_assets.get(name)
+    if asset is None:
+        return name
+    body = asset['body']
+    if INLINE_ASSETS and asset['size'] <= INLINE_ASSET_MAX_BYTES:
+        encoded = base64.b64encode(body.variants['identity']).decode('ascii')
+        return f"data:{body.mimetype};base64,{encoded}"
+    return f"static/{asset['hashed_name']}"
+
+index_page = None
+index_page_lock = threading.Lock()
+
+def get_index_page():
+    """Return the main page, rendered once since it only depends on the environment"""
+    global index_page
+    if index_page is None:
+        with index_page_lock:
+            if index_page is None:
+                index_page = StaticBody(generate_html_content().encode('utf-8'), 'text/html')
+    return index_page
+
 def generate_html_content():
     """Generate HTML content for the main page"""
     if CLOUD_PROVIDER == 'aws_and_azure':
@@ -414,6 +3659,7 @@ def generate_tabbed_html():
             .provider-info a {{ color: #0066cc; }}
             .diagram-container {{ margin: 20px 0; text-align: center; }}
             .diagram-container img {{ max-width: 100%; height: auto; border: 1px solid #ddd; border-radius: 5px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }}
+            {INVENTORY_CSS}
         </style>
     </head>
     <body>
@@ -429,7 +3675,7 @@ def generate_tabbed_html():
             <div id="aws" class="tab-content active">
                 <div class="provider-info">
                     <h2>AWS Information</h2>
-                    <img src="aws-logo.svg" alt="AWS Logo" width="150"><br>
+                    <img src="{asset_url('aws-logo.svg')}" alt="AWS Logo" width="150"><br>
                     <p><strong>AWS_ACCESS_KEY_ID:</strong> {AWS_ACCESS_KEY_ID}</p>
                     <p><strong>AWS_SECRET_ACCESS_KEY:</strong> {AWS_SECRET_ACCESS_KEY}</p>
                     <p><strong>AWS_ROUTE53_DOMAIN:</strong> {AWS_ROUTE53_DOMAIN}</p>
@@ -438,13 +3684,17 @@ def generate_tabbed_html():
                     <p><strong>AWS_WEB_CONSOLE_USER_NAME:</strong> {AWS_WEB_CONSOLE_USER_NAME}</p>
                     <p><strong>AWS_WEB_CONSOLE_PASSWORD:</strong> {AWS_WEB_CONSOLE_PASSWORD}</p>
                     <p><strong>AWS_SANDBOX_ACCOUNT_ID:</strong> {AWS_SANDBOX_ACCOUNT_ID}</p>
+                    
+                    <div class="diagram-container">
+                        {get_aws_inventory_html()}
+                    </div>
                 </div>
             </div>
             
             <div id="azure" class="tab-content">
                 <div class="provider-info">
                     <h2>Azure Resource Topology</h2>
-                    <img src="azure-logo.svg" alt="Azure Logo" width="150"><br>
+                    <img src="{asset_url('azure-logo.svg')}" alt="Azure Logo" width="150"><br>
                     
                     <!-- Collapsible Credentials Section -->
                     <div style="margin: 20px 0;">
@@ -536,6 +3786,7 @@ def generate_single_provider_html():
             a {{ color: #0066cc; }}
             .diagram-container {{ margin: 20px 0; text-align: center; }}
             .diagram-container img {{ max-width: 100%; height: auto; border: 1px solid #ddd; border-radius: 5px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }}
+            {INVENTORY_CSS}
         </style>
     </head>
     <body>
@@ -546,7 +3797,7 @@ def generate_single_provider_html():
     if CLOUD_PROVIDER == 'aws':
         html += f"""
         <h2>AWS Information</h2>
-        <img src="aws-logo.svg" alt="AWS Logo" width="150"><br>
+        <img src="{asset_url('aws-logo.svg')}" alt="AWS Logo" width="150"><br>
         <p><strong>AWS_ACCESS_KEY_ID:</strong> {AWS_ACCESS_KEY_ID}</p>
         <p><strong>AWS_SECRET_ACCESS_KEY:</strong> {AWS_SECRET_ACCESS_KEY}</p>
         <p><strong>AWS_ROUTE53_DOMAIN:</strong> {AWS_ROUTE53_DOMAIN}</p>
@@ -555,11 +3806,15 @@ def generate_single_provider_html():
         <p><strong>AWS_WEB_CONSOLE_USER_NAME:</strong> {AWS_WEB_CONSOLE_USER_NAME}</p>
         <p><strong>AWS_WEB_CONSOLE_PASSWORD:</strong> {AWS_WEB_CONSOLE_PASSWORD}</p>
         <p><strong>AWS_SANDBOX_ACCOUNT_ID:</strong> {AWS_SANDBOX_ACCOUNT_ID}</p>
+        
+        <div class="diagram-container">
+            {get_aws_inventory_html()}
+        </div>
         """
     elif CLOUD_PROVIDER == 'azure':
         html += f"""
         <h2>Azure Resource Topology</h2>
-        <img src="azure-logo.svg" alt="Azure Logo" width="150"><br>
+        <img src="{asset_url('azure-logo.svg')}" alt="Azure Logo" width="150"><br>
         
         <!-- Collapsible Credentials Section -->
         <div style="margin: 20px 0;">
@@ -620,33 +3875,126 @@ def generate_single_provider_html():
 @app.route('/')
 def index():
     """Main page route"""
-    return render_template_string(generate_html_content())
+    # The page shows credentials, so it must stay out of shared caches
+    return serve_static_body(get_index_page(), 'private, no-cache')
+
+@app.route('/static/<path:filename>')
+def static_asset(filename):
+    """Serve a content-hashed asset from memory; its URL changes whenever it does"""
+    asset = static_assets.get(filename)
+    if asset is None or filename != asset['hashed_name']:
+        abort(404)
+    return serve_static_body(asset['body'], 'public, max-age=31536000, immutable')
 
 @app.route('/aws-logo.svg')
 def aws_logo():
     """Serve AWS logo"""
-    try:
-        return send_file('aws-logo.svg', mimetype='image/svg+xml')
-    except FileNotFoundError:
-        abort(404)
+    return serve_legacy_asset('aws-logo.svg')
 
 @app.route('/azure-logo.svg')
 def azure_logo():
     """Serve Azure logo"""
-    try:
-        return send_file('azure-logo.svg', mimetype='image/svg+xml')
-    except FileNotFoundError:
+    return serve_legacy_asset('azure-logo.svg')
+
+def serve_legacy_asset(name):
+    """Serve an asset under its unhashed URL, which may change, with a short max-age"""
+    asset = static_assets.get(name)
+    if asset is None:
         abort(404)
+    return serve_static_body(asset['body'], 'public, max-age=300')
 
 @app.route('/api/azure-resources')
 def azure_resources_api():
-    """API endpoint to get Azure resources asynchronously"""
+    """API endpoint to get Azure resources asynchronously
+
+    Serves the cached snapshot; pass ``?refresh=1`` to force a synchronous refetch.
+    The response is versioned: a matching ``If-None-Match`` gets a 304, and
+    ``?since=<version>`` returns only the changes relative to that version.
+    ``?format=columns`` returns compact columnar data instead of HTML. Any of
+    the QUERY_PARAMS switches to a filtered, sorted and paged table view.
+    """
+    if background_startup.login_pending() and azure_inventory_cache.peek() is None:
+        # Nothing to show until the background login finishes; don't cache a failure
+        response = jsonify({
+            'success': False,
+            'warming_up': True,
+            'message': 'Warming up: signing in to Azure...',
+            'retry_after': STARTUP_RETRY_AFTER,
+            'auth': azure_credentials.describe(),
+            'html': create_azure_warming_up_html()
+        })
+        response.status_code = 503
+        response.headers['Retry-After'] = str(STARTUP_RETRY_AFTER)
+        return response
+
     try:
-        html_content = generate_azure_diagram()
-        return jsonify({
-            'success': True,
-            'html': html_content
+        timings = []
+        force = request.args.get('refresh', '').lower() in ('1', 'true', 'yes')
+        with timed_stage('cache_lookup', timings):
+            entry, result = azure_inventory_cache.lookup(force=force)
+        held_back = azure_refresh_wait('user') if result == 'throttled' else 0
+        snapshot = entry['payload']
+        version = snapshot.version if entry['success'] else None
+        if version and not held_back and request.if_none_match.contains_weak(version):
+            response = Response(status=304)
+            response.set_etag(version)
+            response.headers['Cache-Control'] = 'no-cache'
+            response.headers['Server-Timing'] = server_timing_header(timings)
+            return response
+
+        with timed_stage('render', timings):
+            body = {
+                'success': entry['success'],
+                'cache': azure_inventory_cache.describe(entry),
+                'auth': azure_credentials.describe(),
+                'throttling': describe_azure_throttling(held_back),
+                'sources': snapshot.sources
+            }
+            if version and any(param in request.args for param in QUERY_PARAMS):
+                try:
+                    result = query_inventory(snapshot, request.args)
+                except ValueError as e:
+                    return jsonify({'success': False, 'error': str(e)}), 400
+                page = result.pop('resources')
+                body['version'] = version
+                body.update(result)
+                if request.args.get('format') == 'columns':
+                    body.update(encode_inventory_columns(page))
+                elif page:
+                    body['html'] = create_resources_html(page, id_prefix='azure-query')
+                elif result['query']['limit']:
+                    body['html'] = '<div style="padding: 20px; text-align: center; color: #666;"><p>No resources match the current filters</p></div>'
+            elif version and request.args.get('format') == 'columns':
+                body['version'] = version
+                body.update(snapshot.columns)
+            elif version:
+                body.update(build_azure_update(snapshot, request.args.get('since')))
+            else:
+                body['version'] = None
+                body['html'] = snapshot.html
+
+        with timed_stage('json_encode', timings):
+            response = jsonify(body)
+        payload_bytes = len(response.get_data())
+        metrics.observe('zt_response_bytes', payload_bytes, endpoint='azure-resources')
+        if version and snapshot.resources and 'query' not in body and 'delta' not in body:
+            # Full inventory responses only: a size regression shows up here first
+            metrics.set('zt_payload_bytes_per_1k_resources', round(payload_bytes * 1000 / len(snapshot.resources)),
+                        endpoint='azure-resources', format='columns' if 'columns' in body else 'html')
+        response.headers['Server-Timing'] = server_timing_header(timings)
+        if version:
+            response.set_etag(version)
+            response.headers['Cache-Control'] = 'no-cache'
+        return response
+    except CliBusyError as e:
+        response = jsonify({
+            'success': False,
+            'error': str(e),
+            'html': create_azure_fallback_html()
         })
+        response.status_code = 503
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response
     except Exception as e:
         print(f"Error in Azure resources API: {e}", file=sys.stderr)
         return jsonify({
@@ -655,10 +4003,380 @@ def azure_resources_api():
             'html': create_azure_fallback_html()
         })
 
+@app.route('/api/azure-resources/stream')
+def azure_resources_stream():
+    """Server-Sent Events stream of inventory updates, fed by the shared poller
+
+    Answers 503 when this process already serves its maximum number of
+    streams; the page then falls back to polling.
+    """
+    if not azure_broadcaster.reserve():
+        response = Response('Too many open event streams', status=503, mimetype='text/plain')
+        response.headers['Retry-After'] = str(int(AZURE_STREAM_FALLBACK_POLL))
+        return response
+
+    def generate():
+        # Subscribe only once the response is being sent, so the finally below
+        # always unsubscribes, even when the client went away before that
+        subscriber = azure_broadcaster.subscribe()
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    message = subscriber.get(timeout=AZURE_STREAM_HEARTBEAT)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if message is None:
+                    return
+                yield message
+        finally:
+            azure_broadcaster.unsubscribe(subscriber)
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Runs when the server closes the response, even if the generator never started
+    response.call_on_close(azure_broadcaster.release)
+    return response
+
+def export_inventory_response(cache, provider):
+    """Stream the cached snapshot of ``cache`` in the requested ``format``
+
+    Filters and sort order follow query_inventory(); the full snapshot never
+    goes through the HTML renderer, and rows are serialized as they are sent.
+    """
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'success': False, 'error': f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+    if provider == 'azure' and background_startup.login_pending() and cache.peek() is None:
+        response = jsonify({'success': False, 'warming_up': True, 'error': 'Warming up: signing in to Azure...'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(STARTUP_RETRY_AFTER)
+        return response
+
+    entry = cache.get()
+    snapshot = entry['payload']
+    if not entry['success']:
+        return jsonify({'success': False, 'error': 'no inventory snapshot available'}), 503
+    try:
+        resources = select_inventory_export(snapshot, request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    version = snapshot.version
+    if request.if_none_match.contains(version):
+        response = Response(status=304)
+        response.set_etag(version)
+        return response
+
+    serialize, mimetype, extension = EXPORT_FORMATS[export_format]
+
+    def generate():
+        sent = 0
+        for chunk in serialize(resources, version):
+            data = chunk.encode('utf-8')
+            sent += len(data)
+            yield data
+        metrics.observe('zt_response_bytes', sent, endpoint=f"{provider}-export")
+
+    response = Response(stream_with_context(generate()), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{provider}-inventory-{version}.{extension}"',
+        'X-Total-Count': str(len(resources)),
+        'Cache-Control': 'no-cache',
+    })
+    response.set_etag(version)
+    return response
+
+@app.route('/api/azure-resources/export')
+def azure_resources_export():
+    """Stream the Azure inventory as ``?format=ndjson`` (default), ``csv`` or ``json``"""
+    return export_inventory_response(azure_inventory_cache, 'azure')
+
+@app.route('/api/aws-resources')
+def aws_resources_api():
+    """API endpoint to get AWS resources asynchronously
+
+    Serves the cached snapshot; pass ``?refresh=1`` to force a synchronous rescan.
+    A matching ``If-None-Match`` gets a 304.
+    """
+    try:
+        timings = []
+        force = request.args.get('refresh', '').lower() in ('1', 'true', 'yes')
+        with timed_stage('cache_lookup', timings):
+            entry = aws_inventory_cache.get(force=force)
+        snapshot = entry['payload']
+        version = snapshot.version if entry['success'] else None
+        if version and request.if_none_match.contains_weak(version):
+            response = Response(status=304)
+            response.set_etag(version)
+            response.headers['Cache-Control'] = 'no-cache'
+            response.headers['Server-Timing'] = server_timing_header(timings)
+            return response
+
+        with timed_stage('json_encode', timings):
+            response = jsonify({
+                'success': entry['success'],
+                'version': version,
+                'cache': aws_inventory_cache.describe(entry),
+                'sources': snapshot.sources,
+                'html': snapshot.html
+            })
+        payload_bytes = len(response.get_data())
+        metrics.observe('zt_response_bytes', payload_bytes, endpoint='aws-resources')
+        if version and snapshot.resources:
+            metrics.set('zt_payload_bytes_per_1k_resources', round(payload_bytes * 1000 / len(snapshot.resources)),
+                        endpoint='aws-resources', format='html')
+        response.headers['Server-Timing'] = server_timing_header(timings)
+        if version:
+            response.set_etag(version)
+            response.headers['Cache-Control'] = 'no-cache'
+        return response
+    except Exception as e:
+        print(f"Error in AWS resources API: {e}", file=sys.stderr)
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'html': create_aws_fallback_html()
+        })
+
+@app.route('/api/aws-resources/export')
+def aws_resources_export():
+    """Stream the AWS inventory as ``?format=ndjson`` (default), ``csv`` or ``json``"""
+    return export_inventory_response(aws_inventory_cache, 'aws')
+
+def parse_history_time(value, default):
+    """Parse a history query time given as Unix seconds or ISO 8601 (UTC unless stated); raises ValueError"""
+    if not value:
+        return default
+    try:
+        timestamp = float(value)
+    except ValueError:
+        moment = datetime.fromisoformat(value)
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        return moment.timestamp()
+    try:
+        # Rejects inf, nan and times too far out to be formatted in the response
+        datetime.fromtimestamp(timestamp, timezone.utc)
+    except (OverflowError, OSError) as e:
+        raise ValueError(str(e)) from e
+    return timestamp
+
+def format_history_time(timestamp):
+    """Format a Unix timestamp as ISO 8601 UTC"""
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+def history_inventory_response(provider):
+    """Reconstruct ``provider``'s inventory as of ``?at=`` (default: now) from the change history"""
+    if inventory_history is None:
+        return jsonify({'success': False, 'error': 'inventory history is disabled'}), 404
+    try:
+        at = parse_history_time(request.args.get('at'), time.time())
+    except ValueError:
+        return jsonify({'success': False, 'error': 'at must be Unix seconds or an ISO 8601 time'}), 400
+    found = inventory_history.inventory_at(provider, at)
+    if found is None:
+        return jsonify({'success': False, 'error': 'no history recorded at that time'}), 404
+    version, recorded_at, resources = found
+    return jsonify({
+        'success': True,
+        'at': format_history_time(at),
+        'version': version,
+        'recorded_at': format_history_time(recorded_at),
+        'count': len(resources),
+        'resources': [r.to_dict() for r in resources],
+    })
+
+def history_changes_response(provider):
+    """List ``provider``'s recorded changes between ``?since=`` and ``?until=`` (default: all up to now)"""
+    if inventory_history is None:
+        return jsonify({'success': False, 'error': 'inventory history is disabled'}), 404
+    try:
+        until = parse_history_time(request.args.get('until'), time.time())
+        since = parse_history_time(request.args.get('since'), 0)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'since and until must be Unix seconds or ISO 8601 times'}), 400
+    versions, rows = inventory_history.changes_between(provider, since, until, HISTORY_MAX_CHANGES + 1)
+    changes = []
+    summary = {'added': 0, 'removed': 0, 'changed': 0}
+    for version, recorded_at, kind, *fields in rows[:HISTORY_MAX_CHANGES]:
+        summary[kind] += 1
+        changes.append({'at': format_history_time(recorded_at), 'version': version, 'change': kind,
+                        'resource': Resource(*fields).to_dict()})
+    return jsonify({
+        'success': True,
+        'since': format_history_time(since),
+        'until': format_history_time(until),
+        'versions': [{'version': version, 'recorded_at': format_history_time(recorded_at), 'resources': count}
+                     for version, recorded_at, count in versions],
+        'summary': summary,
+        'truncated': len(rows) > HISTORY_MAX_CHANGES,
+        'changes': changes,
+    })
+
+@app.route('/api/azure-resources/history')
+def azure_resources_history():
+    """Azure inventory as it was at ``?at=<time>``"""
+    return history_inventory_response('azure')
+
+@app.route('/api/azure-resources/changes')
+def azure_resources_changes():
+    """Azure resources added, removed or changed between ``?since=`` and ``?until=``"""
+    return history_changes_response('azure')
+
+@app.route('/api/aws-resources/history')
+def aws_resources_history():
+    """AWS inventory as it was at ``?at=<time>``"""
+    return history_inventory_response('aws')
+
+@app.route('/api/aws-resources/changes')
+def aws_resources_changes():
+    """AWS resources added, removed or changed between ``?since=`` and ``?until=``"""
+    return history_changes_response('aws')
+
+@app.route('/api/azure-diagram')
+def azure_diagram_api():
+    """API endpoint returning the diagram SVG for the viewport ``x,y,width,height``"""
+    try:
+        viewport = tuple(int(float(v)) for v in request.args.get('viewport', '').split(','))
+        if len(viewport) != 4:
+            raise ValueError
+    except (ValueError, OverflowError):
+        # int() raises OverflowError for an infinite coordinate
+        return jsonify({'success': False, 'error': 'viewport must be x,y,width,height'}), 400
+
+    entry = azure_inventory_cache.get()
+    snapshot = entry['payload']
+    if not entry['success'] or snapshot.layout is None:
+        return jsonify({'success': False, 'error': 'no inventory snapshot available'})
+    return jsonify({
+        'success': True,
+        'svg': render_diagram_svg(snapshot.layout, viewport, edges=snapshot.edges)
+    })
+
+@app.route('/api/cli-executor')
+def cli_executor_api():
+    """API endpoint exposing Azure CLI executor queue depth and wait times"""
+    return jsonify(azure_cli_executor.stats())
+
+@app.after_request
+def compress_api_response(response):
+    """Compress JSON API responses with the best encoding the client accepts
+
+    Compressed responses get a weak ETag, since their bytes differ from the
+    identity encoding; the inventory APIs compare If-None-Match weakly.
+    """
+    if (not request.path.startswith('/api/') or response.status_code != 200 or response.is_streamed
+            or response.mimetype != 'application/json' or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < API_COMPRESS_MIN_BYTES:
+        return response
+    encoding = negotiate_encoding(('br', 'gzip') if brotli is not None else ('gzip',))
+    if encoding == 'identity':
+        return response
+
+    timings = []
+    with timed_stage('compress', timings):
+        # Fast settings: these bodies are compressed on every request
+        data = brotli.compress(data, quality=5) if encoding == 'br' else gzip.compress(data, compresslevel=6)
+    response.set_data(data)
+    response.content_encoding = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    timing = server_timing_header(timings)
+    response.headers['Server-Timing'] = f"{response.headers['Server-Timing']}, {timing}" if 'Server-Timing' in response.headers else timing
+    return response
+
+@app.before_request
+def ensure_background_startup():
+    """Start login and the first fetches in processes not started through __main__"""
+    background_startup.start()
+
+@app.route('/healthz')
+def healthz():
+    """Liveness probe: the process is up and serving requests"""
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz')
+def readyz():
+    """Readiness probe: credentials are valid and every provider has a snapshot to serve"""
+    ready, checks = background_startup.readiness()
+    response = jsonify({'ready': ready, 'checks': checks})
+    response.status_code = 200 if ready else 503
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape endpoint for this process"""
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8',
+                    headers={'Cache-Control': 'no-store'})
+
+def collect_cache_metrics():
+    """Refresh cache gauges: hit ratio, snapshot age and resource count"""
+    for cache in (azure_inventory_cache, aws_inventory_cache):
+        lookups = {result: metrics.value('zt_cache_requests_total', cache=cache.name, result=result)
+                   for result in ('hit', 'stale', 'throttled', 'miss')}
+        total = sum(lookups.values())
+        if total:
+            metrics.set('zt_cache_hit_ratio', (total - lookups['miss']) / total, cache=cache.name)
+        entry = cache.peek()
+        if entry is not None:
+            metrics.set('zt_cache_age_seconds', round(time.time() - entry['fetched_at'], 3), cache=cache.name)
+            metrics.set('zt_inventory_resources', len(entry['payload'].resources), cache=cache.name)
+
+def collect_credential_metrics():
+    """Report how long the current Azure credentials remain valid"""
+    if azure_credentials.expires_at is not None:
+        metrics.set('zt_credential_expiry_seconds', round(azure_credentials.expires_at - time.time(), 3))
+
+def collect_cli_executor_metrics():
+    """Mirror the Azure CLI executor's queue depth and outcome counters"""
+    stats = azure_cli_executor.stats()
+    for state in ('running', 'waiting'):
+        metrics.set('zt_cli_executor_commands', stats[state], state=state)
+    for outcome in ('completed', 'rejected', 'timed_out'):
+        metrics.set('zt_cli_executor_commands_total', stats[outcome], outcome=outcome)
+
+metrics.add_collector(collect_cache_metrics)
+metrics.add_collector(collect_cli_executor_metrics)
+metrics.add_collector(collect_credential_metrics)
+
+# Serve the inventories saved before the last restart until their first refresh
+# completes; in production this runs in the master, before workers are forked
+azure_inventory_cache.restore()
+aws_inventory_cache.restore()
+
+def run_production_server():
+    """Serve the app with gunicorn: pre-forked workers, each with a thread pool"""
+    from gunicorn.app.base import BaseApplication
+
+    class ProductionServer(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f"0.0.0.0:{PORT}")
+            self.cfg.set('workers', WEB_WORKERS)
+            # Threaded workers. Every open event stream holds one of a worker's
+            # threads, so AZURE_STREAM_MAX_PER_WORKER keeps some free for requests
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('threads', WEB_THREADS)
+            self.cfg.set('timeout', WEB_TIMEOUT)
+            self.cfg.set('accesslog', '-')
+            # Login and warm-up threads must start in each worker, after the fork
+            self.cfg.set('post_worker_init', lambda worker: background_startup.start())
+
+        def load(self):
+            return app
+
+    ProductionServer().run()
+
 if __name__ == '__main__':
-    # Perform Azure login on startup if Azure credentials are provided
-    if CLOUD_PROVIDER in ['azure', 'aws_and_azure'] and AZURE_CLIENT_ID != 'Not set':
-        print("Attempting Azure CLI login...")
-        perform_azure_login()
-    
-    app.run(host='0.0.0.0', port=PORT, debug=False)
\ No newline at end of file
+    # Azure login and the first inventory fetches run in the background, so the
+    # port is bound immediately; /readyz reports when they have completed
+    if SERVER_MODE == 'production':
+        run_production_server()
+    else:
+        background_startup.start()
+        app.run(host='0.0.0.0', port=PORT, debug=False)
\ No newline at end of file
@@ -0,0 +1,33 @@
+"""Helpers shared by the benchmark scripts"""
+import os
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FAKE_AZ_DIR = os.path.join(REPO_DIR, 'bench', 'fake-az')
+
+def percentile(sorted_values, fraction):
+    """Return the nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+def run_header(title):
+    """Describe a benchmark run: what, when, and at which commit"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or 'unknown'
+    except (OSError, subprocess.SubprocessError):
+        commit = 'unknown'
+    started = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')
+    return f"# {title} at {started}, commit {commit}, Python {sys.version.split()[0]}"
+
+def emit(lines, output=None):
+    """Print report lines, and append them to ``output`` when given"""
+    text = '\n'.join(lines) + '\n'
+    sys.stdout.write(text)
+    if output:
+        with open(output, 'a') as f:
+            f.write(text + '\n')
@@ -0,0 +1,64 @@
+"""Generate synthetic ``az resource list`` output for benchmarks
+
+The records match AZURE_RESOURCE_QUERY in app.py and are deterministic for a
+given size, group count and seed, so runs are comparable over time.
+
+    python bench/generate_inventory.py 10000 --groups 200 > inventory.json
+"""
+import argparse
+import json
+import random
+
+# (provider type, name prefix) pairs, weighted roughly like a real subscription
+RESOURCE_TYPES = [
+    ('Microsoft.Compute/virtualMachines', 'vm'),
+    ('Microsoft.Compute/disks', 'disk'),
+    ('Microsoft.Network/networkInterfaces', 'nic'),
+    ('Microsoft.Network/virtualNetworks', 'vnet'),
+    ('Microsoft.Network/publicIPAddresses', 'pip'),
+    ('Microsoft.Network/networkSecurityGroups', 'nsg'),
+    ('Microsoft.Storage/storageAccounts', 'st'),
+    ('Microsoft.Web/sites', 'app'),
+    ('Microsoft.Sql/servers/databases', 'sqldb'),
+    ('Microsoft.KeyVault/vaults', 'kv'),
+    ('Microsoft.ContainerService/managedClusters', 'aks'),
+    ('Microsoft.Network/loadBalancers', 'lb'),
+]
+RESOURCE_WEIGHTS = [10, 12, 12, 3, 6, 4, 5, 4, 3, 2, 1, 2]
+LOCATIONS = ['eastus', 'eastus2', 'westus', 'westeurope', 'northeurope', 'southeastasia']
+
+# Inventory sizes benchmarked when none are given
+DEFAULT_SIZES = [10, 1000, 10000, 100000]
+
+def default_groups(count):
+    """Return the group count used for an inventory size when none is given: about 20 resources per group"""
+    return max(1, count // 20)
+
+def make_inventory(count, groups=None, seed=0, subscription='00000000-0000-0000-0000-000000000000'):
+    """Return ``count`` resource records spread over ``groups`` resource groups"""
+    rng = random.Random(seed)
+    groups = groups or default_groups(count)
+    types = rng.choices(RESOURCE_TYPES, weights=RESOURCE_WEIGHTS, k=count)
+    records = []
+    for i, (resource_type, prefix) in enumerate(types):
+        group = f"rg-bench-{i % groups:05d}"
+        name = f"{prefix}-{i:06d}"
+        records.append({
+            'id': f"/subscriptions/{subscription}/resourceGroups/{group}/providers/{resource_type}/{name}",
+            'name': name,
+            'type': resource_type,
+            'resourceGroup': group,
+            'location': LOCATIONS[rng.randrange(len(LOCATIONS))],
+        })
+    return records
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('count', type=int, help='number of resources')
+    parser.add_argument('--groups', type=int, help='number of resource groups (default: count / 20)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    print(json.dumps(make_inventory(args.count, args.groups, args.seed)))
+
+if __name__ == '__main__':
+    main()
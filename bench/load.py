@@ -0,0 +1,141 @@
+"""End-to-end load driver for the Flask app
+
+Starts app.py with the benchmark ``az`` stub first on PATH, waits for the
+first inventory fetch, then has ``--concurrency`` keep-alive clients request
+the given paths for ``--duration`` seconds. Reports throughput and latency
+percentiles per path.
+
+    python bench/load.py --size 10000 --concurrency 16 --duration 30
+    python bench/load.py --server-mode production --path /api/azure-resources --path /
+"""
+import argparse
+import http.client
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from common import FAKE_AZ_DIR, REPO_DIR, emit, percentile, run_header
+
+def free_port():
+    """Return a TCP port that is currently free on localhost"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_app(args, port):
+    """Start app.py against the stub CLI and return the process"""
+    env = dict(os.environ)
+    env.update({
+        'PORT': str(port),
+        'PATH': FAKE_AZ_DIR + os.pathsep + env.get('PATH', ''),
+        'CLOUD_PROVIDER': 'azure',
+        'AZURE_CLIENT_MODE': 'cli',
+        'SERVER_MODE': args.server_mode,
+        'BENCH_INVENTORY_SIZE': str(args.size),
+        'BENCH_INVENTORY_GROUPS': str(args.groups or 0),
+        'BENCH_AZ_DELAY': str(args.az_delay),
+    })
+    env.pop('AZURE_CLIENT_ID', None)  # never log a real service principal in
+    return subprocess.Popen([sys.executable, os.path.join(REPO_DIR, 'app.py')], env=env, cwd=REPO_DIR,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL if not args.verbose else None,
+                            start_new_session=True)
+
+def wait_until_ready(port, timeout):
+    """Wait for the inventory endpoint to answer, which also warms the cache"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+            conn.request('GET', '/api/azure-resources')
+            response = conn.getresponse()
+            response.read()
+            conn.close()
+            if response.status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"app did not become ready within {timeout}s")
+
+def client(port, paths, deadline, results, offset):
+    """Request ``paths`` round-robin over one keep-alive connection until ``deadline``"""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    i = offset
+    while time.monotonic() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            conn.request('GET', path, headers={'Accept-Encoding': 'gzip'})
+            response = conn.getresponse()
+            body = response.read()
+            ok = response.status in (200, 304)
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            body, ok = b'', False
+        results[path].append((time.perf_counter() - started, ok, len(body)))
+    conn.close()
+
+def run_load(port, paths, concurrency, duration):
+    """Drive load from ``concurrency`` threads and return per-path samples and the elapsed time"""
+    results = {path: [] for path in paths}
+    started = time.monotonic()
+    deadline = started + duration
+    threads = [threading.Thread(target=client, args=(port, paths, deadline, {p: results[p] for p in paths}, n))
+               for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.monotonic() - started
+
+def report(results, elapsed):
+    """Format throughput and latency percentiles per path"""
+    lines = [f"{'path':<40} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50_ms':>9} {'p90_ms':>9} {'p99_ms':>9} {'max_ms':>9} {'avg_bytes':>10}"]
+    for path, samples in results.items():
+        latencies = sorted(sample[0] * 1000 for sample in samples)
+        errors = sum(1 for sample in samples if not sample[1])
+        average_bytes = sum(sample[2] for sample in samples) / len(samples) if samples else 0
+        lines.append(f"{path:<40} {len(samples):>9} {errors:>7} {len(samples) / elapsed:>9.1f} "
+                     f"{percentile(latencies, 0.50):>9.2f} {percentile(latencies, 0.90):>9.2f} "
+                     f"{percentile(latencies, 0.99):>9.2f} {(latencies[-1] if latencies else 0):>9.2f} {average_bytes:>10.0f}")
+    return lines
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--path', action='append', help='path to request, repeatable (default: /api/azure-resources)')
+    parser.add_argument('--size', type=int, default=1000, help='resources returned by the stub CLI')
+    parser.add_argument('--groups', type=int, help='resource groups in the synthetic inventory')
+    parser.add_argument('--az-delay', type=float, default=0.0, help='seconds the stub CLI sleeps per call')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds of load')
+    parser.add_argument('--server-mode', choices=('development', 'production'), default='development')
+    parser.add_argument('--startup-timeout', type=float, default=120.0)
+    parser.add_argument('--output', help='also append the report to this file')
+    parser.add_argument('--verbose', action='store_true', help="show the app's stderr")
+    args = parser.parse_args()
+    paths = args.path or ['/api/azure-resources']
+
+    port = free_port()
+    proc = start_app(args, port)
+    try:
+        wait_until_ready(port, args.startup_timeout)
+        results, elapsed = run_load(port, paths, args.concurrency, args.duration)
+    finally:
+        os.killpg(proc.pid, signal.SIGTERM)
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+
+    title = (f"Load test ({args.server_mode}, {args.size} resources, concurrency {args.concurrency}, "
+             f"{args.duration:g}s)")
+    emit([run_header(title)] + report(results, elapsed), args.output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Micro-benchmarks for parsing and rendering the Azure inventory
+
+Times each stage of turning ``az resource list`` JSON into the page payload,
+for synthetic inventories of several sizes and group counts, and reports the
+median and best wall time plus the peak memory allocated by the stage.
+
+    python bench/micro.py                       # 10, 1k, 10k and 100k resources
+    python bench/micro.py --sizes 1000,10000 --groups 10,500 --output bench_output.txt
+
+Run with AZURE_COMPACT_OUTPUT=false to measure the legacy inline-styled markup.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+from common import REPO_DIR, emit, run_header
+from generate_inventory import DEFAULT_SIZES, make_inventory
+
+sys.path.insert(0, REPO_DIR)
+import app  # noqa: E402
+
+def group_variants(count):
+    """Return a few group counts for a size: few large groups to many small ones"""
+    return sorted({max(1, count // divisor) for divisor in (1000, 50, 5)})
+
+def measure(fn, repeat, budget):
+    """Return ``(median_ms, best_ms, peak_kib)`` for calling ``fn``
+
+    Runs at least once and at most ``repeat`` times, stopping early once
+    ``budget`` seconds have been spent. Peak memory is measured in a separate
+    run since tracing slows the stage down.
+    """
+    samples = []
+    spent = 0.0
+    while len(samples) < repeat and (not samples or spent < budget):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        samples.append(elapsed)
+        spent += elapsed
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return statistics.median(samples) * 1000, min(samples) * 1000, peak / 1024
+
+def bench_inventory(count, groups, repeat, budget):
+    """Benchmark every stage for one synthetic inventory, returning report rows"""
+    raw = json.dumps(make_inventory(count, groups))
+    resources = app.parse_azure_json(raw)
+    layout = app.layout_diagram(resources)
+    html = app.create_diagram_svg(layout) + app.create_resources_html(resources)
+
+    stages = [
+        ('parse', lambda: app.parse_azure_json(raw)),
+        ('layout', lambda: app.layout_diagram(resources)),
+        ('svg_render', lambda: app.create_diagram_svg(layout)),
+        ('table_render', lambda: app.create_resources_html(resources)),
+        ('columns_encode', lambda: app.encode_inventory_columns(resources)),
+        ('json_encode', lambda: json.dumps({'success': True, 'html': html})),
+        ('snapshot_build', lambda: app.build_azure_snapshot(app.parse_azure_json(raw))),
+    ]
+    rows = []
+    for stage, fn in stages:
+        median_ms, best_ms, peak_kib = measure(fn, repeat, budget)
+        rows.append(f"{count:>8} {groups:>7} {stage:<15} {median_ms:>11.2f} {best_ms:>11.2f} {peak_kib:>11.0f}")
+    html_bytes = len(html.encode('utf-8'))
+    for label, size in (('az_json_bytes', len(raw)), ('html_bytes', html_bytes),
+                        ('html_per_1k', round(html_bytes * 1000 / count))):
+        rows.append(f"{count:>8} {groups:>7} {label:<15} {size:>11} {'-':>11} {'-':>11}")
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='comma-separated inventory sizes')
+    parser.add_argument('--groups', help='comma-separated group counts (default: a few per size)')
+    parser.add_argument('--repeat', type=int, default=5, help='maximum timed runs per stage')
+    parser.add_argument('--budget', type=float, default=2.0, help='seconds after which a stage stops repeating')
+    parser.add_argument('--output', help='also append the report to this file')
+    args = parser.parse_args()
+
+    markup = 'compact' if app.AZURE_COMPACT_OUTPUT else 'legacy'
+    lines = [run_header(f"Micro-benchmark ({markup} markup)"),
+             f"{'size':>8} {'groups':>7} {'stage':<15} {'median_ms':>11} {'best_ms':>11} {'peak_kib':>11}"]
+    emit(lines)
+    report = list(lines)
+    for count in (int(size) for size in args.sizes.split(',')):
+        variants = [int(g) for g in args.groups.split(',')] if args.groups else group_variants(count)
+        for groups in variants:
+            rows = bench_inventory(count, groups, args.repeat, args.budget)
+            emit(rows)
+            report.extend(rows)
+    if args.output:
+        with open(args.output, 'a') as f:
+            f.write('\n'.join(report) + '\n\n')
+
+if __name__ == '__main__':
+    main()